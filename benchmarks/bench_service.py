@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the FastAPI service.
+
+Each scenario starts a fresh `uvicorn main:app` process on the stub LLM
+backend (driven by a recorded latency profile), sends load at a fixed
+concurrency or request rate, and records throughput, latency percentiles,
+event-loop lag, upstream token usage and peak RSS. Results are written as JSON so runs can be
+compared between commits.
+
+Example:
+    python benchmarks/bench_service.py --requests 40 --concurrency 8 --time-scale 0.1 --output bench.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PROFILE = Path(__file__).resolve().parent / "latency_profiles.json"
+DURATION_TIERS = ["1-3 minutes", "3-5 minutes", "5-10 minutes", "10+ minutes"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_kb(pid: int) -> Optional[int]:
+    """Peak resident set size of a process in kB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def upstream_tokens(metrics_text: str) -> Dict[str, int]:
+    """Prompt, completion and cached prompt token totals from the server's /metrics output"""
+    totals = {"prompt": 0, "completion": 0, "cached_prompt": 0}
+    for line in metrics_text.splitlines():
+        if not line.startswith("vpa_upstream_tokens_total{"):
+            continue
+        labels, value = line.rsplit(" ", 1)
+        for kind in totals:
+            if f'kind="{kind}"' in labels:
+                totals[kind] += int(float(value))
+    return totals
+
+
+def engine_decisions(metrics_text: str) -> Dict[str, int]:
+    """Generations per engine that actually ran, from the server's /metrics output"""
+    counts: Dict[str, int] = {}
+    for line in metrics_text.splitlines():
+        if not line.startswith("vpa_engine_decisions_total{"):
+            continue
+        labels, value = line.rsplit(" ", 1)
+        engine = labels.split('engine="', 1)[1].split('"', 1)[0]
+        counts[engine] = counts.get(engine, 0) + int(float(value))
+    return counts
+
+
+def token_usage(before: Dict[str, int], after: Dict[str, int], completed: int) -> Dict:
+    """Upstream tokens spent on the measured requests, in total and per completed request"""
+    spent = {kind: after[kind] - before[kind] for kind in after}
+    return {
+        **spent,
+        "per_request": {kind: round(count / completed, 1) if completed else None for kind, count in spent.items()}
+    }
+
+
+class Server:
+    """A `uvicorn main:app` subprocess on the stub backend"""
+
+    def __init__(self, args, workdir: str):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        env = {
+            **os.environ,
+            "LLM_BACKEND": "stub",
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "stub"),
+            "STUB_LATENCY_PROFILE": str(args.profile),
+            "STUB_TIME_SCALE": str(args.time_scale),
+            "STUB_SEED": str(args.seed),
+            "JOB_WORKERS": "0",
+            "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+            "CACHE_DB_PATH": "",
+            "OPENAI_MAX_CONCURRENCY": str(args.upstream_concurrency),
+            # Every benchmark request comes from one client; measure generation, not admission control
+            "QUOTA_REQUESTS_PER_MINUTE": "0",
+            "QUOTA_TOKENS_PER_MINUTE": "0",
+            "ADMISSION_MAX_IN_FLIGHT": "0"
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env
+        )
+
+    async def wait_ready(self, timeout: float = 30):
+        deadline = time.time() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.time() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError("Server exited during startup")
+                try:
+                    if (await client.get(self.base_url + "/")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Server did not become ready")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def request_body(idea: str, tier: str) -> Dict:
+    return {"idea": idea, "platform": "youtube", "duration": tier, "target_audience": "general", "tone": "engaging"}
+
+
+async def drive_load(client: httpx.AsyncClient, base_url: str, bodies: List[Dict], mode: str,
+                     concurrency: int, rate: float, rng: random.Random) -> Dict:
+    """Send every body once; closed-loop at `concurrency`, or open-loop Poisson arrivals at `rate` req/s"""
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(body: Dict, scheduled_at: float):
+        nonlocal errors
+        async with slots:
+            try:
+                response = await client.post(f"{base_url}/generate-video-production", params={"mode": mode}, json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+        if ok:
+            latencies.append(time.perf_counter() - scheduled_at)
+        else:
+            errors += 1
+
+    started = time.perf_counter()
+    tasks = []
+    for body in bodies:
+        if rate > 0:
+            await asyncio.sleep(rng.expovariate(rate))
+        tasks.append(asyncio.create_task(send(body, time.perf_counter())))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(bodies),
+        "completed": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None
+        }
+    }
+
+
+async def run_scenario(args, mode: str, cache: str, tier: str, workdir: str) -> Dict:
+    server = Server(args, workdir)
+    try:
+        await server.wait_ready()
+        rng = random.Random(args.seed)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+            if cache == "warm":
+                # Prime a small set of ideas, then replay them so every measured request hits the cache
+                distinct = [request_body(f"benchmark idea {index}", tier) for index in range(args.warm_ideas)]
+                await drive_load(client, server.base_url, distinct, mode, args.concurrency, 0, rng)
+                bodies = [distinct[index % len(distinct)] for index in range(args.requests)]
+            else:
+                bodies = [request_body(f"benchmark idea {index}", tier) for index in range(args.requests)]
+
+            tokens_before = upstream_tokens((await client.get(f"{server.base_url}/metrics")).text)
+            result = await drive_load(client, server.base_url, bodies, mode, args.concurrency, args.rate, rng)
+            server_stats = (await client.get(f"{server.base_url}/stats")).json()
+            metrics_after = (await client.get(f"{server.base_url}/metrics")).text
+            tokens_after = upstream_tokens(metrics_after)
+
+        # A mode is not always the engine that runs it, e.g. fast requests for long durations go long-form
+        engines = engine_decisions(metrics_after)
+        engine = next(iter(engines)) if len(engines) == 1 else "mixed"
+        if engine != mode:
+            print(f"  mode={mode} duration={tier} ran as {engine}: {engines}", file=sys.stderr)
+        result.update({
+            "mode": mode,
+            "engine": engine,
+            "engine_generations": engines,
+            "cache": cache,
+            "duration": tier,
+            "event_loop_lag_ms": server_stats.get("event_loop_lag"),
+            "cache_stats": server_stats.get("cache"),
+            "tokens": token_usage(tokens_before, tokens_after, result["completed"]),
+            "peak_rss_kb": peak_rss_kb(server.process.pid)
+        })
+        return result
+    finally:
+        server.stop()
+
+
+async def main_async(args) -> Dict:
+    scenarios = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode, cache, tier in itertools.product(args.modes, args.cache, args.durations):
+            print(f"Running mode={mode} cache={cache} duration={tier}", file=sys.stderr)
+            scenarios.append(await run_scenario(args, mode, cache, tier, workdir))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "profile": str(args.profile),
+            "time_scale": args.time_scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "upstream_concurrency": args.upstream_concurrency
+        },
+        "scenarios": scenarios
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum client requests in flight")
+    parser.add_argument("--rate", type=float, default=0, help="open-loop arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--modes", default="fast,detailed", help="comma-separated generation modes (fast, detailed, longform, auto)")
+    parser.add_argument("--cache", default="cold,warm", help="comma-separated cache states")
+    parser.add_argument("--durations", default=",".join(DURATION_TIERS), help="comma-separated duration tiers")
+    parser.add_argument("--warm-ideas", type=int, default=4, help="distinct ideas primed for warm-cache runs")
+    parser.add_argument("--profile", type=Path, default=DEFAULT_PROFILE, help="stub latency profile JSON")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="scale simulated latencies (e.g. 0.1 for quick runs)")
+    parser.add_argument("--upstream-concurrency", type=int, default=10, help="OPENAI_MAX_CONCURRENCY for the server")
+    parser.add_argument("--request-timeout", type=float, default=300, help="client timeout per request in seconds")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", type=Path, help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    args.modes = [mode for mode in args.modes.split(",") if mode]
+    args.cache = [state for state in args.cache.split(",") if state]
+    args.durations = [tier for tier in args.durations.split(",") if tier]
+    return args
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(main_async(args)), indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Two-tier cache for generated production packages and their sections.
+
+The memory tier is an LRU with a TTL and entry/byte limits. The optional
+SQLite tier survives restarts and can be shared by several uvicorn workers
+on the same host.
+
+Whole packages are keyed on the full request and the engine that generates
+them, so one mode is never served another's package. Individual sections are keyed
+only on the request fields and upstream sections they read, so changing
+e.g. the duration leaves sections that never look at it cached.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+def normalize_idea(idea: str) -> str:
+    """Collapse whitespace and case so trivially different ideas share a key"""
+    return " ".join(idea.split()).lower()
+
+
+def cache_key(input_data: BaseModel, variant: Optional[str] = None) -> str:
+    """Canonical hash of a VideoIdeaInput, plus the engine (`variant`) that generates it if given"""
+    fields = input_data.model_dump()
+    if variant is not None:
+        fields["variant"] = variant
+    fields["idea"] = normalize_idea(fields["idea"])
+    payload = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def section_cache_key(section: str, input_data: BaseModel, fields: Iterable[str], deps: Dict[str, Any]) -> str:
+    """Hash of the input fields and upstream section results one section reads"""
+    inputs = {field: getattr(input_data, field) for field in fields}
+    if "idea" in inputs:
+        inputs["idea"] = normalize_idea(inputs["idea"])
+    payload = json.dumps({"section": section, "inputs": inputs, "deps": deps}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional SQLite store, values kept as JSON"""
+
+    def __init__(self, namespace: str, max_entries: int = 1000, max_bytes: int = 50_000_000,
+                 ttl_seconds: float = 86400, db_path: Optional[str] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._sets_since_purge = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        if db_path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, time.time())
+            ).fetchone()
+        return row
+
+    def _disk_set(self, key: str, value: str, expires_at: float, purge: bool):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, expires_at)
+            )
+            if purge:
+                conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self._memory_delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        if self.max_entries <= 0 or len(value) > self.max_bytes:
+            return
+        self._memory_delete(key)
+        self._entries[key] = (value, expires_at)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._memory_delete(oldest)
+
+    def _memory_delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    async def get(self, key: str, record: bool = True) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss.
+
+        `record=False` leaves the hit/miss counters alone, for lookups that
+        are not a request asking for this exact entry.
+        """
+        value = self._memory_get(key)
+        if value is not None:
+            if record:
+                self.memory_hits += 1
+            return json.loads(value)
+
+        if self.db_path:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None:
+                if record:
+                    self.disk_hits += 1
+                self._memory_set(key, row[0], row[1])
+                return json.loads(row[0])
+
+        if record:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Store a JSON-serializable value in every enabled tier"""
+        encoded = json.dumps(value, separators=(",", ":"))
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, encoded, expires_at)
+
+        if self.db_path:
+            # Sweep expired rows every so often instead of on every write
+            self._sets_since_purge += 1
+            purge = self._sets_since_purge >= 100
+            if purge:
+                self._sets_since_purge = 0
+            await asyncio.to_thread(self._disk_set, key, encoded, expires_at, purge)
+
+    def record_bypass(self):
+        self.bypasses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "disk_enabled": bool(self.db_path)
+        }
+
+
+class SectionCache:
+    """Per-section results stored in a TieredCache, with hits and misses counted per section"""
+
+    def __init__(self, store: TieredCache, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    async def get(self, section: str, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        value = await self.store.get(key)
+        counts = self.misses if value is None else self.hits
+        counts[section] = counts.get(section, 0) + 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        if self.enabled:
+            await self.store.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        sections = {}
+        for section in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(section, 0), self.misses.get(section, 0)
+            sections[section] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4)}
+        return {"enabled": self.enabled, "sections": sections, **self.store.stats()}
+
+
+# Shared cache for complete production packages
+production_cache = TieredCache(
+    "production",
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", "50000000")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "86400")),
+    db_path=os.getenv("CACHE_DB_PATH") or None
+)
+
+# Shared cache for individual sections generated by focused calls
+section_cache = SectionCache(
+    TieredCache(
+        "sections",
+        max_entries=int(os.getenv("SECTION_CACHE_MAX_ENTRIES", "5000")),
+        max_bytes=int(os.getenv("SECTION_CACHE_MAX_BYTES", "50000000")),
+        ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "86400")),
+        db_path=os.getenv("CACHE_DB_PATH") or None
+    ),
+    enabled=os.getenv("SECTION_CACHE_ENABLED", "1") == "1"
+)
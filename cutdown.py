@@ -0,0 +1,75 @@
+"""
+Deterministic cut-downs of a shared screenplay for platforms with a length cap.
+
+A multi-platform package writes the screenplay, shots and dialogue once.
+Platforms that cap video length get the same content with every timing
+scaled down to fit the cap, so no extra model call is needed.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Longest video to plan for on each platform, e.g. "instagram=90,tiktok=180"; unlisted platforms are not cut
+PLATFORM_MAX_SECONDS = {
+    name.strip(): int(seconds)
+    for name, _, seconds in (entry.partition("=") for entry in os.getenv("PLATFORM_MAX_SECONDS", "instagram=90,tiktok=180").split(","))
+    if name.strip() and seconds.strip()
+}
+
+_TIMING = re.compile(r"^\s*(\d+):(\d{2})\s*-\s*(\d+):(\d{2})\s*$")
+_SECONDS = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(seconds?|secs?|s)\s*$", re.IGNORECASE)
+
+
+def parse_timing(timing: Any) -> Optional[Tuple[int, int]]:
+    """(start, end) seconds of an "m:ss-m:ss" timing, or None"""
+    match = _TIMING.match(timing) if isinstance(timing, str) else None
+    if not match:
+        return None
+    start_min, start_sec, end_min, end_sec = (int(group) for group in match.groups())
+    return start_min * 60 + start_sec, end_min * 60 + end_sec
+
+
+def format_timing(start: int, end: int) -> str:
+    return f"{start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}"
+
+
+def total_seconds(screenplay: List[Dict]) -> int:
+    """Length of a screenplay: the latest scene end time"""
+    ends = [parsed[1] for parsed in (parse_timing(scene.get("timing")) for scene in screenplay if isinstance(scene, dict)) if parsed]
+    return max(ends, default=0)
+
+
+def _scale_timing(timing: Any, factor: float) -> Any:
+    parsed = parse_timing(timing)
+    if parsed is None:
+        return timing
+    return format_timing(round(parsed[0] * factor), round(parsed[1] * factor))
+
+
+def _scale_duration(duration: Any, factor: float) -> Any:
+    match = _SECONDS.match(duration) if isinstance(duration, str) else None
+    if not match:
+        return duration
+    return f"{max(1, round(float(match.group(1)) * factor))} seconds"
+
+
+def cut_down(package: Dict[str, Any], max_seconds: Optional[int]) -> Dict[str, Any]:
+    """Copy of `package` with screenplay, dialogue and shot timings scaled to fit `max_seconds`.
+
+    Packages that already fit, or platforms without a cap, come back unchanged.
+    """
+    length = total_seconds(package.get("screenplay", []))
+    if not max_seconds or length <= max_seconds:
+        return package
+    factor = max_seconds / length
+
+    def scaled(items: List[Any], key: str, scale) -> List[Any]:
+        return [{**item, key: scale(item.get(key), factor)} if isinstance(item, dict) and key in item else item for item in items]
+
+    return {
+        **package,
+        "screenplay": scaled(package.get("screenplay", []), "timing", _scale_timing),
+        "dialogue": scaled(package.get("dialogue", []), "timing", _scale_timing),
+        "shot_list": scaled(package.get("shot_list", []), "duration", _scale_duration)
+    }
@@ -0,0 +1,105 @@
+"""
+Request deadlines.
+
+A client can send `X-Request-Timeout: <seconds>` to say how long it is
+willing to wait. The deadline is held in a context variable for the rest of
+the request, so every upstream call made on its behalf (including calls in
+tasks it spawns) knows how much time is left. `chat_completion` uses it as
+the call timeout and shrinks `max_tokens` when the remaining time cannot
+fit a full-length completion, so a shorter answer arrives in time instead
+of none at all. Only an answer actually cut off at the smaller limit marks
+the request degraded; most completions end well short of `max_tokens`.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Applied when the client sends no timeout (0 = no deadline)
+REQUEST_TIMEOUT_DEFAULT = float(os.getenv("REQUEST_TIMEOUT_DEFAULT", "0"))
+# Assumed upstream speed, used to size max_tokens to the remaining budget. gpt-4o-mini writes about
+# 70-100 tokens/s (see benchmarks/latency_profiles.json), so most calls are not cut at all.
+DEADLINE_FIRST_TOKEN_SECONDS = float(os.getenv("DEADLINE_FIRST_TOKEN_SECONDS", "1.0"))
+DEADLINE_TOKENS_PER_SECOND = float(os.getenv("DEADLINE_TOKENS_PER_SECOND", "80"))
+# Smallest completion worth asking for; below this the call is not made at all
+DEADLINE_MIN_TOKENS = int(os.getenv("DEADLINE_MIN_TOKENS", "100"))
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before its result was ready"""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its result was ready"""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        # Set once a call whose max_tokens was cut to fit the budget came back cut off
+        self.degraded = False
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def detached(self) -> "Deadline":
+        """A deadline expiring at the same time, with its own degraded flag"""
+        deadline = Deadline(self.seconds)
+        deadline.expires_at = self.expires_at
+        return deadline
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Seconds from an X-Request-Timeout header, falling back to REQUEST_TIMEOUT_DEFAULT"""
+    if value is None or not value.strip():
+        return REQUEST_TIMEOUT_DEFAULT or None
+    seconds = float(value)
+    if seconds <= 0:
+        raise ValueError("X-Request-Timeout must be a positive number of seconds")
+    return seconds
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Apply a deadline of `seconds` (None = unbounded) to the code inside the block"""
+    with applied_deadline(Deadline(seconds) if seconds else None) as deadline:
+        yield deadline
+
+
+@contextmanager
+def applied_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Apply an existing deadline (None = unbounded) to the code inside the block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def budget_max_tokens(requested: int) -> int:
+    """Largest max_tokens that can still finish before the current deadline.
+
+    Raises DeadlineExceeded when not even DEADLINE_MIN_TOKENS would fit.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return requested
+    affordable = int((deadline.remaining() - DEADLINE_FIRST_TOKEN_SECONDS) * DEADLINE_TOKENS_PER_SECOND)
+    if affordable >= requested:
+        return requested
+    if affordable < min(requested, DEADLINE_MIN_TOKENS):
+        raise DeadlineExceeded("Not enough time left for another upstream call")
+    return affordable
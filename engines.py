@@ -0,0 +1,220 @@
+"""
+Choosing a generation engine per request.
+
+The engines are "fast" (the whole package from one large call), "detailed"
+(focused calls per section, fanned out) and "longform" (an outline, then
+scenes in parallel). A caller may name one with `mode`. With `mode=auto`
+the selector picks one from what it has seen for the same duration tier:
+  - latency of recent generations per engine;
+  - how often each engine failed, or returned a package that needed JSON
+    repair or came back partial (truncated or unparseable output);
+    generations cut short by the client's own X-Request-Timeout are
+    counted apart and left out, as they say nothing about the engine;
+  - the rate-limit scheduler's free upstream slots. A fan-out engine is
+    skipped while it would mostly queue behind other calls.
+
+Until an engine has ENGINE_MIN_SAMPLES outcomes for a tier, the tier's
+default engine is used. A small share of auto requests (ENGINE_EXPLORE_RATE)
+tries another candidate, so every engine keeps being measured. Every
+decision is logged with its outcome. With ENGINE_DECISION_LOG set, each
+one is also appended as a JSON line, so the policy can be tuned from data.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+from deadlines import current_deadline
+from metrics import registry
+from rate_limit import rate_limiter
+
+# Engine used when the caller names none: fast, detailed, longform or auto (opt-in; the default stays fast)
+ENGINE_DEFAULT_MODE = os.getenv("ENGINE_DEFAULT_MODE", "fast")
+# Outcomes per engine and tier needed before the policy trusts them
+ENGINE_MIN_SAMPLES = int(os.getenv("ENGINE_MIN_SAMPLES", "10"))
+# Recent outcomes kept per engine and tier
+ENGINE_WINDOW = int(os.getenv("ENGINE_WINDOW", "100"))
+# Share of auto decisions that try a candidate other than the policy's pick
+ENGINE_EXPLORE_RATE = float(os.getenv("ENGINE_EXPLORE_RATE", "0.05"))
+# How much a failed or degraded generation costs, in multiples of the engine's median latency
+ENGINE_QUALITY_PENALTY = float(os.getenv("ENGINE_QUALITY_PENALTY", "2.0"))
+# JSON-lines file of decisions and outcomes (unset = log to stdout only)
+ENGINE_DECISION_LOG = os.getenv("ENGINE_DECISION_LOG") or None
+
+# Upstream calls an engine makes at once, compared against the scheduler's free slots
+ENGINE_FANOUT = {"fast": 1, "detailed": 9, "longform": 8}
+
+ENGINE_DECISIONS = registry.counter("vpa_engine_decisions_total", "Generation engine choices by engine and reason")
+
+_current: ContextVar[Optional["EngineDecision"]] = ContextVar("engine_decision", default=None)
+
+
+class EngineDecision:
+    """One engine choice, filled in with its outcome once the generation finishes"""
+
+    def __init__(self, tier: str, mode: str, engine: str, reason: str, scores: Dict[str, Optional[float]], headroom: float):
+        self.tier = tier
+        self.mode = mode
+        self.engine = engine
+        self.reason = reason
+        self.scores = scores
+        self.headroom = headroom
+        self.created_at = time.time()
+        self.seconds: Optional[float] = None
+        self.status: Optional[str] = None
+        self.degraded = False
+        # Set when the request's deadline cut the generation short or ran out
+        self.deadline_limited = False
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "time": round(self.created_at, 3),
+            "tier": self.tier,
+            "mode": self.mode,
+            "engine": self.engine,
+            "reason": self.reason,
+            "scores": self.scores,
+            "headroom": self.headroom,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "status": self.status,
+            "degraded": self.degraded,
+            "deadline_limited": self.deadline_limited
+        }
+
+
+def note_degraded():
+    """Mark the generation running in this context as degraded, e.g. when its JSON needed repair"""
+    decision = _current.get()
+    if decision is not None:
+        decision.degraded = True
+
+
+class EngineSelector:
+    """Per-tier outcome windows per engine, and the policy choosing between them"""
+
+    def __init__(self, min_samples: int = ENGINE_MIN_SAMPLES, window: int = ENGINE_WINDOW,
+                 explore_rate: float = ENGINE_EXPLORE_RATE, log_path: Optional[str] = ENGINE_DECISION_LOG,
+                 rng: Optional[random.Random] = None):
+        self.min_samples = min_samples
+        self.window = window
+        self.explore_rate = explore_rate
+        self.log_path = log_path
+        self.rng = rng or random.Random()
+        # (engine, tier) -> recent (seconds, ok) outcomes; ok is False for failed or degraded generations
+        self.outcomes: Dict[Tuple[str, str], Deque[Tuple[float, bool]]] = {}
+        # (engine, tier) -> generations left out of the outcomes because the request's deadline limited them
+        self.deadline_limited: Dict[Tuple[str, str], int] = {}
+        self.decisions: Dict[str, int] = {}
+
+    def score(self, engine: str, tier: str) -> Optional[float]:
+        """Median seconds, inflated by the failure and degradation rate; None until there are enough samples"""
+        outcomes = self.outcomes.get((engine, tier))
+        if outcomes is None or len(outcomes) < self.min_samples:
+            return None
+        ordered = sorted(seconds for seconds, _ in outcomes)
+        problem_rate = sum(1 for _, ok in outcomes if not ok) / len(outcomes)
+        return ordered[len(ordered) // 2] * (1 + ENGINE_QUALITY_PENALTY * problem_rate)
+
+    def _headroom(self) -> float:
+        return round(max(0.0, rate_limiter.limit - rate_limiter.in_flight - rate_limiter.queue_depth), 2)
+
+    def named(self, tier: str, mode: str, engine: str) -> EngineDecision:
+        """Record an engine the caller chose, so its outcome still feeds the policy"""
+        return self._decided(EngineDecision(tier, mode, engine, "caller", {engine: self.score(engine, tier)}, self._headroom()))
+
+    def choose(self, tier: str, candidates: Sequence[str], default: str) -> EngineDecision:
+        """Pick the engine for an auto request among `candidates`; `default` is used until it has data"""
+        mode = "auto"
+        headroom = self._headroom()
+        scores = {engine: self.score(engine, tier) for engine in candidates}
+
+        # Fan-out engines would mostly queue while the scheduler has few free slots
+        eligible = [engine for engine in candidates if ENGINE_FANOUT.get(engine, 1) <= max(headroom, 1)] or [default]
+        measured = [engine for engine in eligible if scores[engine] is not None]
+        if default in eligible and scores[default] is None:
+            # Not enough data on the default yet to argue with it
+            engine, reason = default, "default"
+        elif measured:
+            engine = min(measured, key=lambda engine: scores[engine])
+            reason = "score" if default in eligible else "headroom"
+        else:
+            engine, reason = min(eligible, key=lambda engine: ENGINE_FANOUT.get(engine, 1)), "headroom"
+
+        others = [candidate for candidate in candidates if candidate != engine]
+        if others and self.rng.random() < self.explore_rate:
+            # Keep measuring the engines the policy is not picking
+            engine, reason = self.rng.choice(others), "explore"
+        return self._decided(EngineDecision(tier, mode, engine, reason, scores, headroom))
+
+    def _decided(self, decision: EngineDecision) -> EngineDecision:
+        self.decisions[decision.reason] = self.decisions.get(decision.reason, 0) + 1
+        ENGINE_DECISIONS.inc(engine=decision.engine, reason=decision.reason)
+        return decision
+
+    @asynccontextmanager
+    async def track(self, decision: EngineDecision):
+        """Time the generation inside the block and record its outcome against the decision"""
+        token = _current.set(decision)
+        start = time.perf_counter()
+        try:
+            yield decision
+        except asyncio.CancelledError:
+            # Abandoned by every waiter; says nothing about the engine
+            decision.status = "cancelled"
+            raise
+        except Exception:
+            decision.status = "failed"
+            raise
+        else:
+            decision.status = "ok"
+        finally:
+            _current.reset(token)
+            decision.seconds = time.perf_counter() - start
+            deadline = current_deadline()
+            decision.deadline_limited = deadline is not None and (deadline.degraded or deadline.expired())
+            key = (decision.engine, decision.tier)
+            if decision.deadline_limited:
+                # Cut max_tokens, truncated JSON or a 504 here come from the client's timeout, not the engine
+                self.deadline_limited[key] = self.deadline_limited.get(key, 0) + 1
+            elif decision.status != "cancelled":
+                outcomes = self.outcomes.get(key)
+                if outcomes is None:
+                    outcomes = self.outcomes[key] = deque(maxlen=self.window)
+                outcomes.append((decision.seconds, decision.status == "ok" and not decision.degraded))
+            await self._log(decision)
+
+    async def _log(self, decision: EngineDecision):
+        print(f"Engine {decision.engine} for {decision.tier!r} ({decision.reason}, mode {decision.mode}): "
+              f"{decision.status} in {decision.seconds:.2f}s{', degraded' if decision.degraded else ''}"
+              f"{', deadline-limited' if decision.deadline_limited else ''}")
+        if self.log_path:
+            line = json.dumps(decision.record(), separators=(",", ":")) + "\n"
+            await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def stats(self) -> Dict[str, Any]:
+        tiers: Dict[str, Dict[str, Any]] = {}
+        for engine, tier in sorted(set(self.outcomes) | set(self.deadline_limited)):
+            outcomes = self.outcomes.get((engine, tier)) or ()
+            ordered = sorted(seconds for seconds, _ in outcomes)
+            score = self.score(engine, tier)
+            tiers.setdefault(tier, {})[engine] = {
+                "samples": len(outcomes),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                "problem_rate": round(sum(1 for _, ok in outcomes if not ok) / len(outcomes), 4) if outcomes else None,
+                "score": round(score, 4) if score is not None else None,
+                "deadline_limited": self.deadline_limited.get((engine, tier), 0)
+            }
+        return {"default_mode": ENGINE_DEFAULT_MODE, "decisions": dict(self.decisions), "tiers": tiers}
+
+
+engine_selector = EngineSelector()
@@ -0,0 +1,146 @@
+"""
+Engagement forecasts computed from coefficient tables, without any LLM call.
+
+A forecast is base_views scaled by one factor per metric from each of the
+platform, duration, target_audience and tone tables, then widened into a
+low-high range. Retention comes from the platform table, shifted by the
+other tables. Tables are loaded once at startup, from FORECAST_COEFFICIENTS_PATH
+when set, and every estimate for a batch of combinations is computed in a
+single NumPy pass.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# JSON file overriding any part of DEFAULT_COEFFICIENTS (unset = use the defaults)
+FORECAST_COEFFICIENTS_PATH = os.getenv("FORECAST_COEFFICIENTS_PATH") or None
+
+METRICS = ("views", "likes", "shares", "comments")
+# Request fields a forecast reads, in the order `forecast` takes them
+DIMENSIONS = ("platform", "duration", "target_audience", "tone")
+
+# Entries may set any of METRICS (missing ones are 1.0); platform entries also set
+# "retention" as [low, high] percent, other entries may set "retention_shift" in points.
+# Each table's "default" entry is used for values it does not list.
+DEFAULT_COEFFICIENTS: Dict[str, Any] = {
+    "base_views": 25000,
+    "range": {"low": 0.6, "high": 1.5},
+    "platform": {
+        "youtube": {"views": 1.0, "likes": 0.05, "shares": 0.01, "comments": 0.02, "retention": [65, 80]},
+        "instagram": {"views": 0.8, "likes": 0.08, "shares": 0.02, "comments": 0.03, "retention": [70, 85]},
+        "tiktok": {"views": 1.5, "likes": 0.1, "shares": 0.03, "comments": 0.04, "retention": [70, 85]},
+        "default": {"views": 1.0, "likes": 0.05, "shares": 0.01, "comments": 0.02, "retention": [70, 85]}
+    },
+    "duration": {"default": {}},
+    "target_audience": {"default": {}},
+    "tone": {"default": {}}
+}
+
+
+class _Table:
+    """One coefficient table as arrays, with a row per listed value and the default row last"""
+
+    def __init__(self, dimension: str, entries: Dict[str, Dict[str, Any]]):
+        if "default" not in entries:
+            raise ValueError(f"Forecast table '{dimension}' has no default entry")
+        self.values = [value for value in entries if value != "default"]
+        self._index = {value: row for row, value in enumerate(self.values)}
+        self._default = len(self.values)
+        rows = [entries[value] for value in self.values] + [entries["default"]]
+        self.factors = np.array([[float(row.get(metric, 1.0)) for metric in METRICS] for row in rows])
+        if dimension == "platform":
+            retention = [row.get("retention") for row in rows]
+            if any(value is None or len(value) != 2 for value in retention):
+                raise ValueError("Every platform entry needs retention as [low, high]")
+            self.retention = np.array(retention, dtype=float)
+        else:
+            self.retention = np.array([[float(row.get("retention_shift", 0.0))] * 2 for row in rows])
+
+    def rows(self, values: Sequence[str]) -> np.ndarray:
+        return np.fromiter((self._index.get(value, self._default) for value in values), dtype=np.intp, count=len(values))
+
+
+class Forecast:
+    """Estimates for a batch of combinations; row i belongs to the i-th combination"""
+
+    def __init__(self, low: np.ndarray, high: np.ndarray, retention: np.ndarray):
+        # (n, len(METRICS)) whole numbers
+        self.low = low
+        self.high = high
+        # (n, 2) percent, low and high
+        self.retention = retention
+
+    def __len__(self) -> int:
+        return len(self.low)
+
+    def estimate(self, row: int) -> Dict[str, Any]:
+        """One combination as the package's estimated_engagement: formatted strings plus numeric ranges"""
+        low, high = self.low[row].tolist(), self.high[row].tolist()
+        retention_low, retention_high = (_percent(value) for value in self.retention[row].tolist())
+        estimate: Dict[str, Any] = {metric: f"{low[i]}-{high[i]}" for i, metric in enumerate(METRICS)}
+        estimate["retention_rate"] = f"{retention_low}-{retention_high}%"
+        ranges: Dict[str, Dict[str, Any]] = {metric: {"low": low[i], "high": high[i]} for i, metric in enumerate(METRICS)}
+        ranges["retention_rate"] = {"low": retention_low, "high": retention_high}
+        estimate["ranges"] = ranges
+        return estimate
+
+    def estimates(self) -> List[Dict[str, Any]]:
+        return [self.estimate(row) for row in range(len(self))]
+
+
+def _percent(value: float):
+    return int(value) if float(value).is_integer() else round(value, 1)
+
+
+class EngagementForecaster:
+    """Vectorized engagement estimates over (platform, duration, target_audience, tone) combinations"""
+
+    def __init__(self, coefficients: Dict[str, Any]):
+        self.base_views = float(coefficients["base_views"])
+        self.range_low = float(coefficients["range"]["low"])
+        self.range_high = float(coefficients["range"]["high"])
+        self.tables = {dimension: _Table(dimension, coefficients[dimension]) for dimension in DIMENSIONS}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "EngagementForecaster":
+        """Build from DEFAULT_COEFFICIENTS, with the top-level keys of the JSON file at `path` replacing them"""
+        coefficients = dict(DEFAULT_COEFFICIENTS)
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                coefficients.update(json.load(f))
+            print(f"Loaded engagement forecast coefficients from {path}")
+        return cls(coefficients)
+
+    def forecast(self, platforms: Sequence[str], durations: Sequence[str],
+                 audiences: Sequence[str], tones: Sequence[str]) -> Forecast:
+        """Estimates for the combinations (platforms[i], durations[i], audiences[i], tones[i])"""
+        columns = (platforms, durations, audiences, tones)
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError("Forecast inputs must all have the same length")
+
+        mid = np.full((len(platforms), len(METRICS)), self.base_views)
+        retention = np.zeros((len(platforms), 2))
+        for dimension, values in zip(DIMENSIONS, columns):
+            table = self.tables[dimension]
+            rows = table.rows(values)
+            mid = mid * table.factors[rows]
+            retention = retention + table.retention[rows]
+
+        # Truncate like int() did; estimates are never negative
+        low = np.floor(mid * self.range_low).astype(np.int64)
+        high = np.floor(mid * self.range_high).astype(np.int64)
+        return Forecast(low, high, np.clip(retention, 0, 100))
+
+    def grid(self, platforms: Sequence[str], durations: Sequence[str],
+             audience: str, tone: str) -> List[Dict[str, Any]]:
+        """Every platform x duration combination for one audience and tone"""
+        pairs = [(platform, duration) for platform in platforms for duration in durations]
+        forecast = self.forecast([p for p, _ in pairs], [d for _, d in pairs], [audience] * len(pairs), [tone] * len(pairs))
+        return [{"platform": platform, "duration": duration, "estimated_engagement": estimate}
+                for (platform, duration), estimate in zip(pairs, forecast.estimates())]
+
+
+forecaster = EngagementForecaster.load(FORECAST_COEFFICIENTS_PATH)
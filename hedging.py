@@ -0,0 +1,151 @@
+"""
+Hedged upstream requests.
+
+If a completion has not returned by a high percentile of recently observed
+latency for the same section and duration tier, an identical second request
+is sent; whichever finishes first wins and the other is cancelled. A token
+budget credited by every primary request caps hedges to a fixed fraction of
+traffic, which bounds the extra token spend.
+
+Hedging starts once the primary holds an upstream slot, and the latencies
+are those of the upstream sends alone, so time queued in the rate-limit
+scheduler neither raises the trigger nor fires hedges. A hedge is skipped
+unless a slot is free right now.
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from metrics import registry
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "5"))
+
+HEDGES = registry.counter("vpa_hedges_total", "Hedged upstream requests by outcome (fired, won, skipped_budget, skipped_capacity)")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per key"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        series = self.samples.get(key)
+        if series is None:
+            series = self.samples[key] = deque(maxlen=self.window)
+        series.append(seconds)
+
+    def percentile(self, key: str, fraction: float, min_samples: int) -> Optional[float]:
+        series = self.samples.get(key)
+        if series is None or len(series) < min_samples:
+            return None
+        ordered = sorted(series)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class HedgeBudget:
+    """Token bucket: each primary request earns `ratio` tokens, each hedge spends one"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def credit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Hedger:
+    def __init__(self, enabled: bool = HEDGE_ENABLED, percentile: float = HEDGE_PERCENTILE,
+                 min_samples: int = HEDGE_MIN_SAMPLES, budget: Optional[HedgeBudget] = None):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget or HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST)
+        self.latencies = LatencyTracker()
+        self.fired = 0
+        self.won = 0
+        self.skipped_budget = 0
+        self.skipped_capacity = 0
+
+    def record(self, key: str, seconds: float):
+        """Note how long a successful upstream send for `key` took"""
+        self.latencies.record(key, seconds)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]], hedge: Optional[Callable[[], Awaitable[Any]]] = None,
+                  ready: Optional[Callable[[], bool]] = None) -> Any:
+        """Run `call`, hedging it once with `hedge` (default: `call`) if it is slower than the tracked percentile for `key`.
+
+        The calls report their own latency with `record`. `ready()` says whether a hedge could go upstream now.
+        """
+        self.budget.credit()
+        threshold = self.latencies.percentile(key, self.percentile, self.min_samples) if self.enabled else None
+        if threshold is None:
+            return await call()
+
+        primary = asyncio.create_task(call())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done:
+                return primary.result()
+
+            if ready is not None and not ready():
+                # A hedge would only queue behind other calls
+                self.skipped_capacity += 1
+                HEDGES.inc(outcome="skipped_capacity")
+                return await primary
+
+            if not self.budget.try_spend():
+                self.skipped_budget += 1
+                HEDGES.inc(outcome="skipped_budget")
+                return await primary
+
+            self.fired += 1
+            HEDGES.inc(outcome="fired")
+            hedge = asyncio.create_task((hedge or call)())
+            tasks.add(hedge)
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.won += 1
+                            HEDGES.inc(outcome="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser (or both, if the caller went away) is cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "fired": self.fired,
+            "won": self.won,
+            "skipped_budget": self.skipped_budget,
+            "skipped_capacity": self.skipped_capacity,
+            "budget_tokens": round(self.budget.tokens, 3)
+        }
+
+
+hedger = Hedger()
@@ -0,0 +1,229 @@
+"""
+Persistent background jobs for long-running package generation.
+
+Jobs are stored in SQLite so they survive a backend restart. A pool of
+async workers claims queued jobs with a renewable lease; a job whose worker
+died is picked up again once its lease expires.
+
+Run `python jobs.py` to start a standalone worker pool, e.g. with
+JOB_WORKERS=0 on the web tier so throughput is sized independently.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from deadlines import deadline_scope
+
+load_dotenv()
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+ProgressCallback = Callable[[float, str], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+
+
+class JobStore:
+    """SQLite-backed job table shared by every worker on the host"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, stage TEXT, "
+                "input TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "lease_expires_at REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL, deadline_at REAL)"
+            )
+            # Stores created before deadlines were supported lack the column
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "deadline_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN deadline_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["input"] = json.loads(job["input"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, job_input: Dict[str, Any], deadline_at: Optional[float] = None) -> Dict[str, Any]:
+        """Queue a job; `deadline_at` (epoch seconds) is when its result stops being useful"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, progress, stage, input, created_at, updated_at, deadline_at) "
+                "VALUES (?, 'queued', 0, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(job_input), now, now, deadline_at)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job, or a running job whose lease expired"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1, "
+                "lease_expires_at = ?, updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND lease_expires_at < ?) ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (now + JOB_LEASE_SECONDS, now, now)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update_progress(self, job_id: str, progress: float, stage: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, stage = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (progress, stage, now + JOB_LEASE_SECONDS, now, job_id)
+            )
+
+    def renew_lease(self, job_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running'",
+                (now + JOB_LEASE_SECONDS, job_id)
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'completed', progress = 100, stage = 'completed', result = ?, "
+                "error = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str, retry: bool):
+        status = "queued" if retry else "failed"
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, error = ?, lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (status, status, error, time.time(), job_id)
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobWorkerPool:
+    """Async workers that claim jobs from the store and run them through `handler`"""
+
+    def __init__(self, store: JobStore, handler: JobHandler, workers: int = JOB_WORKERS):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job is submitted in this process"""
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+
+        async def report_progress(progress: float, stage: str):
+            await asyncio.to_thread(self.store.update_progress, job_id, progress, stage)
+
+        async def keep_lease():
+            while True:
+                await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+                await asyncio.to_thread(self.store.renew_lease, job_id)
+
+        timeout = job["deadline_at"] - time.time() if job["deadline_at"] else None
+        if timeout is not None and timeout <= 0:
+            await asyncio.to_thread(self.store.fail, job_id, "Deadline passed before the job started", False)
+            return
+
+        heartbeat = asyncio.create_task(keep_lease())
+        try:
+            # Upstream calls see the job's remaining time, as they would for a synchronous request
+            with deadline_scope(timeout):
+                result = await asyncio.wait_for(self.handler(job["input"], report_progress), timeout)
+            await asyncio.to_thread(self.store.complete, job_id, result)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job to be reclaimed when its lease runs out
+            raise
+        except asyncio.TimeoutError:
+            print(f"Job {job_id} abandoned: deadline passed")
+            await asyncio.to_thread(self.store.fail, job_id, "Deadline passed before the job finished", False)
+        except Exception as e:
+            retry = job["attempts"] < JOB_MAX_ATTEMPTS and (timeout is None or job["deadline_at"] > time.time())
+            print(f"Job {job_id} failed (attempt {job['attempts']}): {str(e)}")
+            await asyncio.to_thread(self.store.fail, job_id, str(e), retry)
+        finally:
+            heartbeat.cancel()
+
+
+async def run_worker_process(handler: JobHandler):
+    """Run a worker pool in its own process until interrupted"""
+    from llm import open_backend, close_backend
+
+    await open_backend()
+    pool = JobWorkerPool(JobStore(JOBS_DB_PATH), handler, max(1, JOB_WORKERS))
+    pool.start()
+    print(f"Job workers running: {pool.workers} (store: {JOBS_DB_PATH})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await close_backend()
+
+
+if __name__ == "__main__":
+    from main import run_job
+
+    try:
+        asyncio.run(run_worker_process(run_job))
+    except KeyboardInterrupt:
+        print("Job workers stopped")
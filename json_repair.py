@@ -0,0 +1,174 @@
+"""
+Recovery for model JSON that does not parse.
+
+A package cut off by `max_tokens`, or wrapped in stray prose, still holds
+most of its sections. `recover_object` pulls the top-level object out of the
+surrounding text and keeps every member that was written in full. A member
+that was cut off, or does not parse, keeps its value up to the last
+complete element, so only the missing sections need generating again.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from json_stream import TopLevelObjectParser
+from metrics import registry
+
+# How far back `loads_truncated` cuts before giving up on a fragment
+MAX_CUT_ATTEMPTS = 50
+
+REPAIRS = registry.counter("vpa_json_repairs_total", "Package JSON repairs by outcome (complete, partial, failed)")
+REPAIRED_SECTIONS = registry.counter("vpa_repaired_sections_total", "Sections of repaired packages by source (followup, truncated, default)")
+
+
+def _scan(text: str) -> Tuple[List[str], bool, bool, List[Tuple[int, str]]]:
+    """Return (open containers, in string, after backslash, safe cut points) at the end of `text`.
+
+    A cut point (index, containers) marks a prefix text[:index] that ends on
+    a complete element (just before a comma, or just after a closing
+    bracket), so closing its containers gives valid JSON.
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = False
+    escape = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if stack:
+                cuts.append((index + 1, "".join(stack)))
+        elif char == "," and stack:
+            cuts.append((index, "".join(stack)))
+    return stack, in_string, escape, cuts
+
+
+def _close(text: str, stack: str, in_string: bool, escape: bool) -> str:
+    if in_string:
+        if escape:
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join("}" if container == "{" else "]" for container in reversed(stack))
+
+
+def _candidates(text: str) -> Iterator[str]:
+    stack, in_string, escape, cuts = _scan(text)
+    yield _close(text, "".join(stack), in_string, escape)
+    for index, cut_stack in reversed(cuts[-MAX_CUT_ATTEMPTS:]):
+        yield _close(text[:index], cut_stack, False, False)
+
+
+def _without_empty_tail(value: Any) -> Any:
+    """Drop the empty {} and [] elements that closing a cut-off container leaves at the end of arrays"""
+    if isinstance(value, list):
+        items = [*value[:-1], _without_empty_tail(value[-1])] if value else []
+        while items and items[-1] in ({}, []):
+            items.pop()
+        return items
+    if isinstance(value, dict) and value:
+        last = next(reversed(value))
+        return {**value, last: _without_empty_tail(value[last])}
+    return value
+
+
+def loads_truncated(text: str) -> Any:
+    """Parse JSON that may have been cut off, dropping at most the incomplete tail.
+
+    Raises ValueError when nothing parseable is left.
+    """
+    for candidate in _candidates(text):
+        try:
+            return _without_empty_tail(json.loads(candidate))
+        except ValueError:
+            continue
+    raise ValueError("Could not repair truncated JSON")
+
+
+class RecoveredObject:
+    """Result of `recover_object`"""
+
+    def __init__(self, data: Dict[str, Any], complete: List[str]):
+        # Every recovered member, including a closed-off truncated one
+        self.data = data
+        # Members that were written in full
+        self.complete = complete
+
+
+def recover_members(parser: TopLevelObjectParser, members: Dict[str, Any]) -> RecoveredObject:
+    """Combine the members `parser` finished with whatever can be saved from the ones it could not decode"""
+    data = dict(members)
+    # Members that did not decode, then the one that was cut off
+    fragments = list(parser.invalid)
+    if not parser.finished and parser.pending.strip():
+        fragments.append(parser.pending)
+    for fragment in fragments:
+        try:
+            salvaged = loads_truncated("{" + fragment)
+        except ValueError:
+            continue
+        for key, value in salvaged.items():
+            data.setdefault(key, value)
+    return RecoveredObject(data, list(members))
+
+
+def recover_object(text: str) -> RecoveredObject:
+    """Recover the top-level JSON object in `text`, tolerating surrounding prose and truncation.
+
+    Raises ValueError when the text holds no object at all.
+    """
+    # Malformed members are set aside rather than raised, so one costs only itself, even on a single line
+    parser = TopLevelObjectParser(skip_invalid=True)
+    members = dict(parser.feed(text))
+
+    recovered = recover_members(parser, members)
+    if not recovered.data:
+        raise ValueError("No JSON object found in model response")
+    return recovered
+
+
+class RepairStats:
+    """How often repair saved a generation, and how"""
+
+    def __init__(self):
+        self.complete = 0
+        self.partial = 0
+        self.failed = 0
+        self.followup_sections = 0
+
+    def record(self, outcome: str, sources: Optional[Dict[str, str]] = None):
+        """Count one repair; `sources` maps each refilled section to followup, truncated or default"""
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        REPAIRS.inc(outcome=outcome)
+        for section, source in (sources or {}).items():
+            if source == "followup":
+                self.followup_sections += 1
+            REPAIRED_SECTIONS.inc(section=section, source=source)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "complete": self.complete,
+            "partial": self.partial,
+            "failed": self.failed,
+            "avoided_regeneration": self.complete + self.partial,
+            "followup_sections": self.followup_sections
+        }
+
+
+repair_stats = RepairStats()
@@ -0,0 +1,84 @@
+"""
+Incremental parser for a JSON object that arrives in streamed chunks.
+
+Only the top level is tracked: each member is decoded and returned as soon
+as its value is complete, without waiting for the rest of the document.
+A member that does not decode raises ValueError, or with `skip_invalid` is
+set aside in `invalid` while parsing carries on with the next member.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class TopLevelObjectParser:
+    """Feed text chunks in; get back (key, value) pairs for completed top-level members"""
+
+    def __init__(self, skip_invalid: bool = False):
+        self.skip_invalid = skip_invalid
+        # Text of members that did not decode, when skipping them
+        self.invalid: List[str] = []
+        self._member: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.finished = False
+
+    @property
+    def pending(self) -> str:
+        """Text of the member still being written, e.g. after the stream was cut off"""
+        return "".join(self._member)
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        members: List[Tuple[str, Any]] = []
+        for char in text:
+            if self.finished:
+                break
+
+            # Skip anything before the opening brace, e.g. a ```json fence
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    members.extend(self._flush())
+                    self.finished = True
+                    continue
+            elif char == "," and self._depth == 1:
+                members.extend(self._flush())
+                continue
+
+            self._member.append(char)
+        return members
+
+    def _flush(self) -> List[Tuple[str, Any]]:
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return []
+        try:
+            return list(json.loads("{" + text + "}").items())
+        except ValueError:
+            if not self.skip_invalid:
+                raise
+            self.invalid.append(text)
+            return []
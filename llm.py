@@ -0,0 +1,297 @@
+"""
+LLM backends for the FastAPI backend.
+
+All completion calls go through `chat_completion` / `stream_chat_completion`,
+which dispatch to the configured backend (LLM_BACKEND=openai|stub) through
+the rate-limit scheduler (see rate_limit.py). Every call names the package section
+it is generating so backends and instrumentation can tell calls apart, and
+the section's route (see routing.py) supplies the model, max_tokens and
+temperature the caller does not pass.
+"""
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from deadlines import DeadlineExceeded, budget_max_tokens, current_deadline
+from hedging import hedger
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS, record_usage
+from rate_limit import estimate_tokens, rate_limiter
+from routing import router
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+# Upstream connection pool and concurrency settings
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Retries are left to the rate-limit scheduler so they queue with everything else
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+
+class LLMBackend:
+    """Interface every completion backend implements.
+
+    `complete` returns an OpenAI-shaped ChatCompletion; `stream` yields
+    content deltas. Both receive the usual chat.completions.create kwargs
+    and the route's `base_url` (None = the backend's own endpoint), pass any
+    rate-limit response headers to `rate_limiter.observe`, and raise errors
+    carrying `status_code` like the OpenAI client does.
+    """
+
+    name = "base"
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def complete(self, section: str, base_url: Optional[str] = None, **kwargs):
+        raise NotImplementedError
+
+    def stream(self, section: str, base_url: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions over a shared, bounded connection pool.
+
+    Routes with their own base_url (e.g. a self-hosted OpenAI-compatible
+    server) get a client and pool of their own, opened on first use.
+    """
+
+    name = "openai"
+
+    def __init__(self):
+        self._clients: Dict[Optional[str], AsyncOpenAI] = {}
+
+    def _create_client(self, base_url: Optional[str]) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=OPENAI_TIMEOUT
+        )
+        return AsyncOpenAI(
+            api_key=os.getenv((base_url and router.api_key_env(base_url)) or "OPENAI_API_KEY"),
+            base_url=base_url or OPENAI_BASE_URL,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+
+    async def open(self):
+        if None not in self._clients:
+            self._clients[None] = self._create_client(None)
+
+    def _client(self, base_url: Optional[str]) -> AsyncOpenAI:
+        client = self._clients.get(base_url)
+        if client is None:
+            client = self._clients[base_url] = self._create_client(base_url)
+        return client
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.close()
+
+    async def complete(self, section: str, base_url: Optional[str] = None, **kwargs):
+        await self.open()
+        raw = await self._client(base_url).chat.completions.with_raw_response.create(**kwargs)
+        rate_limiter.observe(raw.headers)
+        return raw.parse()
+
+    async def stream(self, section: str, base_url: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        await self.open()
+        stream = await self._client(base_url).chat.completions.create(stream=True, **kwargs)
+        rate_limiter.observe(stream.response.headers)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.response.aclose()
+
+
+def create_backend(name: str) -> LLMBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "stub":
+        from stub_backend import StubBackend
+        return StubBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def get_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_backend(LLM_BACKEND)
+    return _backend
+
+
+def set_backend(backend: LLMBackend):
+    """Swap the active backend, e.g. for load tests"""
+    global _backend
+    _backend = backend
+
+
+async def open_backend() -> LLMBackend:
+    """Open the configured backend and its connection pool"""
+    backend = get_backend()
+    await backend.open()
+    return backend
+
+
+async def close_backend() -> None:
+    """Close the active backend and release pooled connections"""
+    if _backend is not None:
+        await _backend.close()
+
+
+def _fit_to_deadline(kwargs: dict) -> bool:
+    """Cut max_tokens to the remaining request time and ask the model to keep within it; True if it was cut"""
+    requested = kwargs.get("max_tokens")
+    if not requested:
+        return False
+    budget = budget_max_tokens(requested)
+    if budget < requested:
+        kwargs["max_tokens"] = budget
+        kwargs["messages"] = list(kwargs.get("messages", [])) + [{
+            "role": "system",
+            "content": f"Time is short: keep the answer brief so it is complete within about {int(budget * 0.8)} tokens."
+        }]
+        return True
+    return False
+
+
+async def chat_completion(section: str, tier: Optional[str] = None, **kwargs):
+    """Create a chat completion without blocking the event loop.
+
+    Calls go upstream through the rate-limit scheduler, which queues them
+    while the adaptive concurrency limit or the provider's budget is used up
+    and retries 429s and 5xx responses. Once a call holds its slot, a slow
+    send may be hedged (see hedging.py), with upstream latency tracked per
+    section and duration `tier`. Under
+    a request deadline (see deadlines.py) the call is cancelled when time
+    runs out and `max_tokens` is cut to what the remaining time can produce.
+    """
+    route = router.route(section)
+    kwargs = route.fill(kwargs)
+    model = kwargs["model"]
+    deadline = current_deadline()
+    limited = deadline is not None and _fit_to_deadline(kwargs)
+    tokens = estimate_tokens(kwargs)
+    key = f"{section}:{tier or 'default'}"
+
+    async def send():
+        start = time.perf_counter()
+        try:
+            response = await get_backend().complete(section, base_url=route.base_url, **kwargs)
+        except Exception:
+            UPSTREAM_REQUESTS.inc(section=section, model=model, outcome="error")
+            router.record_error(route)
+            raise
+        seconds = time.perf_counter() - start
+        UPSTREAM_SECONDS.observe(seconds, section=section, model=model)
+        UPSTREAM_REQUESTS.inc(section=section, model=model, outcome="ok")
+        record_usage(section, getattr(response, "usage", None))
+        router.record(route, seconds, response)
+        hedger.record(key, seconds)
+        return response
+
+    async def hedge():
+        # Takes a second slot only if one is free now, and is not retried
+        async with rate_limiter.slot(tokens, wait=False):
+            try:
+                response = await send()
+            except Exception as e:
+                rate_limiter.record_error(e)
+                raise
+        rate_limiter.record_success()
+        return response
+
+    async def attempt():
+        # Runs once the primary holds its slot, so only the upstream send is hedged
+        return await hedger.run(key, send, hedge, ready=lambda: rate_limiter.has_free_slot(tokens))
+
+    if deadline is None:
+        return await rate_limiter.call(section, attempt, tokens)
+    try:
+        response = await asyncio.wait_for(rate_limiter.call(section, attempt, tokens), deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Request deadline passed while generating {section}")
+    choices = getattr(response, "choices", None)
+    if limited and choices and choices[0].finish_reason == "length":
+        # The answer did not fit the smaller budget, so it is shorter than a full one
+        deadline.degraded = True
+    return response
+
+
+async def stream_chat_completion(section: str, **kwargs) -> AsyncIterator[str]:
+    """Stream a chat completion, yielding content deltas as they arrive.
+
+    The scheduler slot is held until the stream is exhausted or closed. A
+    stream that fails before its first delta is retried like `chat_completion`;
+    once content has been yielded, errors are raised. Request deadlines apply
+    as in `chat_completion`, except that the stream carries no finish reason:
+    the caller marks the deadline degraded if the content comes back cut off.
+    """
+    route = router.route(section)
+    kwargs = route.fill(kwargs)
+    model = kwargs["model"]
+    deadline = current_deadline()
+    if deadline is not None:
+        _fit_to_deadline(kwargs)
+    tokens = estimate_tokens(kwargs)
+
+    attempt = 0
+    while True:
+        delay = None
+        async with rate_limiter.slot(tokens):
+            start = time.perf_counter()
+            stream = get_backend().stream(section, base_url=route.base_url, **kwargs)
+            started = False
+            try:
+                while True:
+                    try:
+                        if deadline is None:
+                            delta = await stream.__anext__()
+                        else:
+                            delta = await asyncio.wait_for(stream.__anext__(), deadline.remaining())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded(f"Request deadline passed while streaming {section}")
+                    started = True
+                    yield delta
+            except Exception as e:
+                UPSTREAM_REQUESTS.inc(section=section, model=model, outcome="error")
+                router.record_error(route)
+                if started or isinstance(e, DeadlineExceeded):
+                    raise
+                delay = rate_limiter.retry_delay(section, e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                await stream.aclose()
+            if delay is None:
+                rate_limiter.record_success()
+                seconds = time.perf_counter() - start
+                UPSTREAM_SECONDS.observe(seconds, section=section, model=model)
+                UPSTREAM_REQUESTS.inc(section=section, model=model, outcome="ok")
+                router.record_stream(route, seconds)
+                return
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,58 @@
+"""
+Event-loop lag sampling.
+
+A background task sleeps for a fixed interval and records how late it wakes
+up. Sustained lag means something is blocking the event loop.
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Optional
+
+# Seconds between samples; 0 disables the monitor
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+
+
+class EventLoopLagMonitor:
+    """Keeps a rolling window of wake-up delays for the running loop"""
+
+    def __init__(self, interval: float = 0.1, window: int = 6000):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        def percentile(fraction: float) -> float:
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(percentile(0.50), 3),
+            "p99_ms": round(percentile(0.99), 3),
+            "max_ms": round(self.max_lag * 1000, 3)
+        }
@@ -1,17 +1,103 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-from openai import OpenAI
+from typing import Any, AsyncIterator, Awaitable, Iterable, List, Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import math
 import os
+import time
 from dotenv import load_dotenv
 import json
 
-load_dotenv()
+from llm import chat_completion, stream_chat_completion, open_backend, close_backend
+from scheduler import Section, run_sections, with_dependents
+from cache import cache_key, production_cache, section_cache, section_cache_key
+from json_stream import TopLevelObjectParser
+from json_repair import RecoveredObject, loads_truncated, recover_members, recover_object, repair_stats
+from singleflight import SingleFlight
+from similarity import SIMILARITY_ENABLED, SIMILARITY_OFFER_THRESHOLD, SIMILARITY_SERVE_THRESHOLD, SimilarIdea, idea_index
+from metrics import METRICS_ENABLED, RequestLatencyMiddleware, current_usage_tally, registry, stage_timer, timed_section, token_totals, usage_tally
+from hedging import hedger
+from rate_limit import RATE_LIMIT_BACKOFF_MAX, UpstreamRateLimited, estimate_tokens, rate_limiter
+from routing import router
+from quotas import Admission, QuotaExceeded, admission_controller, client_id
+from forecasting import forecaster
+from engines import ENGINE_DEFAULT_MODE, EngineDecision, engine_selector, note_degraded
+from prompts import (duration_plan, plan_tier, dialogue_messages, outline_messages, package_messages, platform_messages,
+                     scene_messages, screenplay_messages, section_messages)
+from cutdown import PLATFORM_MAX_SECONDS, cut_down
+from deadlines import ClientDisconnected, Deadline, DeadlineExceeded, applied_deadline, current_deadline, deadline_scope, parse_timeout
+from loop_monitor import EventLoopLagMonitor, LOOP_LAG_INTERVAL
+from jobs import JobStore, JobWorkerPool, JOBS_DB_PATH, JOB_WORKERS
 
-app = FastAPI(title="AI Video Production Assistant", version="1.0.0")
+load_dotenv()
 
-# Configure OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Maximum number of package sections generated at the same time in multi-call mode
+SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", "6"))
+
+# Batch generation limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_STREAM_THRESHOLD = int(os.getenv("BATCH_STREAM_THRESHOLD", "20"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Durations generated long-form (outline, then scenes in parallel) instead of in one large call
+LONGFORM_DURATIONS = {tier.strip() for tier in os.getenv("LONGFORM_DURATIONS", "10+ minutes").split(",") if tier.strip()}
+LONGFORM_CONCURRENCY = int(os.getenv("LONGFORM_CONCURRENCY", "12"))
+
+# Sections generated at once for a multi-platform package (shared sections plus one call per platform)
+MULTI_PLATFORM_CONCURRENCY = int(os.getenv("MULTI_PLATFORM_CONCURRENCY", "12"))
+
+# Upstream tokens of each engine relative to one fast call, from the max_tokens of the calls it makes.
+# Quotas are charged this estimate up front and settled against the tokens really used.
+ENGINE_TOKEN_FACTORS = {"fast": 1.0, "detailed": 1.7, "longform": 3.4}
+# A multi-platform package: the shared sections, plus one small call per platform
+MULTI_PLATFORM_TOKEN_FACTORS = {"shared": 1.1, "platform": 0.3}
+
+# Largest platform x duration grid one /engagement-forecast request may ask for
+FORECAST_MAX_COMBINATIONS = int(os.getenv("FORECAST_MAX_COMBINATIONS", "10000"))
+
+# Regenerate sections lost from a truncated package with focused calls (0 = fill them with defaults)
+REPAIR_FOLLOWUP_CALLS = os.getenv("REPAIR_FOLLOWUP_CALLS", "1") == "1"
+
+# How often a waiting handler checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# Generations currently running, keyed on the canonical input
+inflight_generations = SingleFlight()
+
+# Samples event-loop lag so blocking work on the loop shows up in /stats
+loop_lag_monitor = EventLoopLagMonitor(LOOP_LAG_INTERVAL)
+
+# Persistent job store and the in-process worker pool (JOB_WORKERS=0 disables it)
+job_store: Optional[JobStore] = None
+job_pool: Optional[JobWorkerPool] = None
+
+def get_job_store() -> JobStore:
+    global job_store
+    if job_store is None:
+        job_store = JobStore(JOBS_DB_PATH)
+    return job_store
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_pool
+    # Open the LLM backend's connection pool on startup and close it on shutdown
+    await open_backend()
+    if LOOP_LAG_INTERVAL > 0:
+        loop_lag_monitor.start()
+    if JOB_WORKERS > 0:
+        job_pool = JobWorkerPool(get_job_store(), run_job, JOB_WORKERS)
+        job_pool.start()
+    yield
+    if job_pool is not None:
+        await job_pool.stop()
+        job_pool = None
+    await loop_lag_monitor.stop()
+    await close_backend()
+
+app = FastAPI(title="AI Video Production Assistant", version="1.0.0", lifespan=lifespan)
+app.add_middleware(RequestLatencyMiddleware)
 
 class VideoIdeaInput(BaseModel):
     idea: str
@@ -31,120 +117,577 @@ class VideoProductionOutput(BaseModel):
     thumbnail_concepts: List[str]
     posting_strategy: Dict
     estimated_engagement: Dict
+    # Set when some sections could not be recovered from a malformed response and hold defaults or truncated content
+    partial: bool = False
+    missing_sections: List[str] = []
+
+# Package fields that describe the package rather than hold a section of it
+PACKAGE_FLAGS = ("partial", "missing_sections")
+
+# Sections computed by the server rather than written by the model
+SERVER_SIDE_SECTIONS = ("estimated_engagement",)
+
+def with_scene_timings(screenplay: Any, input_data: VideoIdeaInput) -> Any:
+    """Number the model's scenes and give them the timings of the duration plan"""
+    if not isinstance(screenplay, list):
+        return screenplay
+    timings = duration_plan(input_data.duration)["scene_timings"]
+    scenes = []
+    for index, scene in enumerate(screenplay):
+        if not isinstance(scene, dict):
+            scenes.append(scene)
+            continue
+        timing = timings[index] if index < len(timings) else scene.get("timing", "")
+        scenes.append({"scene": index + 1, "timing": timing, **{k: v for k, v in scene.items() if k not in ("scene", "timing")}})
+    return scenes
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str  # ok, error
+    result: Optional[VideoProductionOutput] = None
+    error: Optional[str] = None
+
+def wants_fresh(cache_control: Optional[str]) -> bool:
+    """True when the client sent Cache-Control: no-cache"""
+    return bool(cache_control and "no-cache" in cache_control.lower())
+
+def request_timeout(x_request_timeout: Optional[str]) -> Optional[float]:
+    """Seconds the client is willing to wait, from its X-Request-Timeout header"""
+    try:
+        return parse_timeout(x_request_timeout)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be a positive number of seconds")
+
+async def until_deadline_or_disconnect(request: Request, work: Awaitable[Any], deadline: Optional[Deadline]) -> Any:
+    """Await `work`, cancelling it if the deadline passes or the client disconnects first"""
+    task = asyncio.ensure_future(work)
+
+    async def watch_disconnect():
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher},
+            timeout=deadline.remaining() if deadline is not None else None,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if task in done:
+            return task.result()
+        if watcher in done:
+            raise ClientDisconnected("Client disconnected before the package was ready")
+        raise DeadlineExceeded("Request deadline passed before the package was ready")
+    finally:
+        task.cancel()
+        watcher.cancel()
+
+def raised_from(e: BaseException, error_type: type) -> Optional[BaseException]:
+    """The first `error_type` among `e` and the exceptions it was raised while handling, or None"""
+    while e is not None:
+        if isinstance(e, error_type):
+            return e
+        e = e.__cause__ or e.__context__
+    return None
+
+def generation_error(e: Exception, deadline: Optional[Deadline]) -> HTTPException:
+    """Map a failed generation to its HTTP error"""
+    message = getattr(e, "detail", None) or str(e)
+    if isinstance(e, ClientDisconnected):
+        # Nobody is listening; nginx's "client closed request" code keeps these apart in the metrics
+        return HTTPException(status_code=499, detail=message)
+    # Section generators re-raise their own errors, so look through the chain for the deadline
+    if raised_from(e, DeadlineExceeded) or (deadline is not None and deadline.expired()):
+        return HTTPException(status_code=504, detail=f"Generation did not finish within the request deadline: {message}")
+    rate_limited = raised_from(e, UpstreamRateLimited)
+    if rate_limited is not None:
+        # The provider is out of capacity for now; tell the client when to come back instead of failing hard
+        retry_seconds = max(1, math.ceil(rate_limited.retry_after or RATE_LIMIT_BACKOFF_MAX))
+        return HTTPException(status_code=503, detail=f"Upstream rate limit reached: {message}",
+                             headers={"Retry-After": str(retry_seconds)})
+    return HTTPException(status_code=500, detail=f"AI generation failed: {message}")
+
+def request_token_estimate(input_data: VideoIdeaInput, factor: float = 1.0) -> int:
+    """Upstream tokens a package is expected to cost, in units of the single fast call"""
+    return int(estimate_tokens({"messages": build_fast_messages(input_data), "max_tokens": router.route("package").max_tokens}) * factor)
+
+async def admit_request(request: Request, x_api_key: Optional[str], requests: int = 1,
+                        tokens: int = 0, slots: int = 1) -> Admission:
+    """Charge the caller's quota and take in-flight slots, or refuse with a 429 and Retry-After"""
+    client = client_id(x_api_key, request.client.host if request.client else None)
+    try:
+        return await admission_controller.admit(client, requests=requests, tokens=tokens, slots=slots)
+    except QuotaExceeded as e:
+        print(f"Refused request from {client}: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+@asynccontextmanager
+async def settled(admission: Admission):
+    """Release `admission` when the block ends, settling its token charge against the tokens used inside"""
+    with usage_tally() as tally:
+        try:
+            yield
+        finally:
+            await admission.release(tally["prompt"] + tally["completion"])
+
+def idea_partition(input_data: VideoIdeaInput, variant: str) -> Tuple[str, ...]:
+    """Request settings other than the idea; near-duplicate ideas only match within the same settings and engine"""
+    return (input_data.platform, input_data.duration, input_data.tone, input_data.target_audience, variant)
+
+async def similar_package(input_data: VideoIdeaInput, variants: List[str], min_score: float,
+                          limit: int) -> List[Tuple[SimilarIdea, VideoProductionOutput]]:
+    """Cached packages for near-duplicate ideas generated by one of `variants`, best match first"""
+    found = [match for variant in variants
+             for match in idea_index.search(input_data.idea, idea_partition(input_data, variant), min_score, limit)]
+    matches = []
+    for match in sorted(found, key=lambda match: -match.score)[:limit]:
+        cached = await production_cache.get(match.key, record=False)
+        if cached is None:
+            # The package has since left the cache
+            idea_index.remove(match.key)
+            continue
+        matches.append((match, VideoProductionOutput(**cached)))
+    return matches
+
+async def store_package(key: str, input_data: VideoIdeaInput, package: VideoProductionOutput,
+                        variant: Optional[str] = None):
+    """Cache a generated package and, given the `variant` it was keyed on, index its idea for similarity matches"""
+    # Partial packages, or ones cut short to meet a deadline, are not kept for other requests
+    deadline = current_deadline()
+    if package.partial or (deadline is not None and deadline.degraded):
+        return
+    await production_cache.set(key, package.model_dump())
+    if variant is not None and SIMILARITY_ENABLED:
+        idea_index.add(key, input_data.idea, idea_partition(input_data, variant))
+
+def generation_engine(input_data: VideoIdeaInput, mode: str) -> str:
+    """Engine for a request: "detailed" (focused calls per section), "longform" (outline, then
+    scenes in parallel) or "fast" (one large call). Fast requests for LONGFORM_DURATIONS go long-form.
+    For "auto" this is the engine used until the selector has data.
+    """
+    if mode in ("fast", "auto") and input_data.duration in LONGFORM_DURATIONS:
+        return "longform"
+    return "fast" if mode == "auto" else mode
+
+def package_variant(input_data: VideoIdeaInput, mode: str) -> str:
+    """What a cached package is keyed on besides the request: the engine a named mode runs, or "auto".
+    Auto packages are whichever engine the selector picked, so they are only served to auto requests.
+    """
+    return mode if mode == "auto" else generation_engine(input_data, mode)
+
+def choose_engine(input_data: VideoIdeaInput, mode: str) -> EngineDecision:
+    """Engine decision for a request; with mode=auto the selector picks one from measured outcomes"""
+    tier = plan_tier(input_data.duration)
+    if mode != "auto":
+        return engine_selector.named(tier, mode, generation_engine(input_data, mode))
+    candidates = ["fast", "detailed"] + (["longform"] if input_data.duration in LONGFORM_DURATIONS else [])
+    return engine_selector.choose(tier, candidates, generation_engine(input_data, mode))
+
+async def produce_package(input_data: VideoIdeaInput, bypass_cache: bool = False,
+                          mode: str = ENGINE_DEFAULT_MODE) -> Tuple[VideoProductionOutput, str]:
+    """Return (package, cache status), generating and caching it on a miss.
+
+    The status is HIT, SIMILAR (a package for a near-duplicate idea was
+    served) or MISS. `mode` picks the generation engine, or lets the
+    selector pick one with "auto" (see engines.py).
+    """
+    # Serve repeated requests from the cache unless the client asks for a fresh package
+    variant = package_variant(input_data, mode)
+    key = cache_key(input_data, variant)
+    if bypass_cache:
+        production_cache.record_bypass()
+    else:
+        cached = await production_cache.get(key)
+        if cached is not None:
+            return VideoProductionOutput(**cached), "HIT"
+        if SIMILARITY_ENABLED and SIMILARITY_SERVE_THRESHOLD <= 1:
+            for match, similar in await similar_package(input_data, [variant], SIMILARITY_SERVE_THRESHOLD, 1):
+                print(f"Serving package for similar idea {match.idea!r} (score {match.score})")
+                return similar, "SIMILAR"
+
+    deadline = current_deadline()
+    tally = current_usage_tally()
+
+    async def generate_and_store() -> Tuple[VideoProductionOutput, bool]:
+        # Runs in a fresh context: it gets a copy of the leader's deadline and charges its tokens to the leader
+        with applied_deadline(deadline.detached() if deadline is not None else None) as flight_deadline, usage_tally(tally):
+            # Only the request that starts a generation chooses its engine
+            decision = choose_engine(input_data, mode)
+            async with engine_selector.track(decision):
+                # Generate complete video production package with timeout protection
+                if decision.engine == "detailed":
+                    production_data = await create_complete_production(input_data, bypass_cache)
+                elif decision.engine == "longform":
+                    production_data = await create_complete_production_longform(input_data, bypass_cache)
+                else:
+                    production_data = await create_complete_production_fast(input_data)
+                if production_data.partial:
+                    note_degraded()
+            await store_package(key, input_data, production_data, variant)
+            return production_data, flight_deadline is not None and flight_deadline.degraded
+
+    # Identical requests already in flight share one generation. A deadline can cut a package short,
+    # so requests only share with others whose deadline ends within the same second, or with none.
+    flight = key if deadline is None else f"{key}@{math.floor(deadline.expires_at)}"
+    production_data, degraded = await inflight_generations.do(flight, generate_and_store)
+    if degraded:
+        deadline.degraded = True
+    return production_data, "MISS"
 
 @app.post("/generate-video-production", response_model=VideoProductionOutput)
-async def generate_video_production(input_data: VideoIdeaInput):
+async def generate_video_production(input_data: VideoIdeaInput, request: Request, response: Response,
+                                    cache_control: Optional[str] = Header(None), x_request_timeout: Optional[str] = Header(None),
+                                    mode: str = Query(ENGINE_DEFAULT_MODE, pattern="^(fast|detailed|longform|auto)$"),
+                                    x_api_key: Optional[str] = Header(None)):
+    timeout = request_timeout(x_request_timeout)
+    # Auto requests are charged as their default engine; the charge is settled against real usage anyway
+    engine = generation_engine(input_data, mode)
+    admission = await admit_request(request, x_api_key, tokens=request_token_estimate(input_data, ENGINE_TOKEN_FACTORS[engine]))
+    async with settled(admission):
+        with deadline_scope(timeout) as deadline:
+            try:
+                production_data, cache_status = await until_deadline_or_disconnect(
+                    request, produce_package(input_data, bypass_cache=wants_fresh(cache_control), mode=mode), deadline
+                )
+                response.headers["X-Cache"] = cache_status
+                if deadline is not None and deadline.degraded:
+                    response.headers["X-Deadline-Degraded"] = "true"
+                return production_data
+            except Exception as e:
+                # If AI generation fails, raise the error
+                print(f"AI generation failed: {str(e)}")
+                raise generation_error(e, deadline)
+
+async def iterate_batch(items: List[VideoIdeaInput], bypass_cache: bool) -> AsyncIterator[BatchItemResult]:
+    """Generate a batch with at most BATCH_CONCURRENCY items in flight, yielding results in completion order"""
+    pending: asyncio.Queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        pending.put_nowait((index, item))
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                production_data, _ = await produce_package(item, bypass_cache=bypass_cache)
+                await results.put(BatchItemResult(index=index, status="ok", result=production_data))
+            except Exception as e:
+                # One failed item must not sink the rest of the batch
+                print(f"Batch item {index} failed: {str(e)}")
+                await results.put(BatchItemResult(index=index, status="error", error=f"AI generation failed: {str(e)}"))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(items)))]
     try:
-        # Generate complete video production package with timeout protection
-        production_data = await create_complete_production_fast(input_data)
-        return production_data
-    except Exception as e:
-        # If AI generation fails, raise the error
-        print(f"AI generation failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+
+@app.post("/generate-video-production/batch")
+async def generate_video_production_batch(items: List[VideoIdeaInput], request: Request, stream: Optional[bool] = None,
+                                          cache_control: Optional[str] = Header(None), x_request_timeout: Optional[str] = Header(None),
+                                          x_api_key: Optional[str] = Header(None)):
+    """Generate many packages at once.
+
+    Small batches return a JSON list in input order. Batches larger than
+    BATCH_STREAM_THRESHOLD (or any batch with ?stream=true) are streamed back
+    as NDJSON, one BatchItemResult per line in completion order. Items still
+    running when the request deadline passes are reported as errors. Every
+    item counts against the caller's quota, and the batch holds one in-flight
+    slot per item it generates at once.
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} items (max {BATCH_MAX_ITEMS})")
+
+    bypass_cache = wants_fresh(cache_control)
+    timeout = request_timeout(x_request_timeout)
+    if stream is None:
+        stream = len(items) > BATCH_STREAM_THRESHOLD
+    tokens = sum(request_token_estimate(item, ENGINE_TOKEN_FACTORS[generation_engine(item, ENGINE_DEFAULT_MODE)]) for item in items)
+    admission = await admit_request(request, x_api_key, requests=len(items), tokens=tokens,
+                                    slots=min(BATCH_CONCURRENCY, len(items)))
+
+    if stream:
+        async def lines():
+            # The deadline starts with the response body; the stream is cancelled if the client disconnects
+            async with settled(admission):
+                with deadline_scope(timeout):
+                    async for item_result in iterate_batch(items, bypass_cache):
+                        yield item_result.model_dump_json() + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def collect() -> List[BatchItemResult]:
+        return [item_result async for item_result in iterate_batch(items, bypass_cache)]
+
+    async with settled(admission):
+        with deadline_scope(timeout) as deadline:
+            try:
+                # Items time out individually, so only a disconnect abandons the whole batch
+                item_results = await until_deadline_or_disconnect(request, collect(), None)
+            except ClientDisconnected as e:
+                raise generation_error(e, deadline)
+    return sorted(item_results, key=lambda item_result: item_result.index)
+
+class MultiPlatformInput(BaseModel):
+    idea: str
+    platforms: List[str] = ["youtube", "instagram", "tiktok"]
+    duration: str = "5-10 minutes"
+    target_audience: str = "general"
+    tone: str = "engaging"
+
+    def for_platform(self, platform: str) -> VideoIdeaInput:
+        return VideoIdeaInput(idea=self.idea, platform=platform, duration=self.duration,
+                              target_audience=self.target_audience, tone=self.tone)
+
+class MultiPlatformOutput(BaseModel):
+    # One package per requested platform, in request order
+    packages: Dict[str, VideoProductionOutput]
+
+@app.post("/generate-video-production/multi-platform", response_model=MultiPlatformOutput)
+async def generate_multi_platform(body: MultiPlatformInput, request: Request, response: Response,
+                                  cache_control: Optional[str] = Header(None), x_request_timeout: Optional[str] = Header(None),
+                                  x_api_key: Optional[str] = Header(None)):
+    """Generate one idea for several platforms at once.
+
+    The screenplay, shots, dialogue, camera angles and music are written once
+    and shared. Each platform gets its own title, hook, thumbnails and posting
+    strategy from a small parallel call, and platforms with a length cap get
+    the shared timings cut down to fit. `X-Cache` lists HIT or MISS per platform.
+    """
+    platforms = list(dict.fromkeys(platform.strip() for platform in body.platforms if platform.strip()))
+    if not platforms:
+        raise HTTPException(status_code=422, detail="At least one platform is required")
+
+    timeout = request_timeout(x_request_timeout)
+    factor = MULTI_PLATFORM_TOKEN_FACTORS["shared"] + MULTI_PLATFORM_TOKEN_FACTORS["platform"] * len(platforms)
+    admission = await admit_request(request, x_api_key, tokens=request_token_estimate(body.for_platform(platforms[0]), factor))
+    async with settled(admission):
+        with deadline_scope(timeout) as deadline:
+            try:
+                packages, statuses = await until_deadline_or_disconnect(
+                    request, produce_multi_platform(body, platforms, wants_fresh(cache_control)), deadline
+                )
+            except Exception as e:
+                print(f"Multi-platform generation failed: {str(e)}")
+                raise generation_error(e, deadline)
+            response.headers["X-Cache"] = ",".join(f"{platform}={statuses[platform]}" for platform in platforms)
+            if deadline is not None and deadline.degraded:
+                response.headers["X-Deadline-Degraded"] = "true"
+    return MultiPlatformOutput(packages=packages)
+
+def multi_platform_key(input_data: VideoIdeaInput) -> str:
+    return "multi-platform:" + cache_key(input_data)
+
+async def produce_multi_platform(body: MultiPlatformInput, platforms: List[str],
+                                 bypass_cache: bool = False) -> Tuple[Dict[str, VideoProductionOutput], Dict[str, str]]:
+    """Return (package per platform, cache status per platform), generating only the platforms not cached.
+
+    Packages are cached apart from single-platform ones, as their timings may be cut down.
+    """
+    packages: Dict[str, VideoProductionOutput] = {}
+    statuses: Dict[str, str] = {}
+    for platform in platforms:
+        if bypass_cache:
+            production_cache.record_bypass()
+            continue
+        cached = await production_cache.get(multi_platform_key(body.for_platform(platform)))
+        if cached is not None:
+            packages[platform] = VideoProductionOutput(**cached)
+            statuses[platform] = "HIT"
+
+    missing = [platform for platform in platforms if platform not in packages]
+    if missing:
+        generated = await create_multi_platform_production(body, missing, bypass_cache)
+        for platform, package in generated.items():
+            platform_input = body.for_platform(platform)
+            await store_package(multi_platform_key(platform_input), platform_input, package)
+            packages[platform] = package
+            statuses[platform] = "MISS"
+    return {platform: packages[platform] for platform in platforms}, statuses
+
+class JobStatus(BaseModel):
+    id: str
+    status: str  # queued, running, completed, failed
+    progress: float
+    stage: Optional[str] = None
+    result: Optional[VideoProductionOutput] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    deadline_at: Optional[float] = None
+
+async def run_job(job_input: Dict, report_progress) -> Dict:
+    """Job handler: generate one package, reporting coarse progress"""
+    input_data = VideoIdeaInput(**job_input)
+    await report_progress(10, "generating")
+    production_data, _ = await produce_package(input_data)
+    return production_data.model_dump()
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(input_data: VideoIdeaInput, request: Request, x_request_timeout: Optional[str] = Header(None),
+                     x_api_key: Optional[str] = Header(None)):
+    """Queue a package for background generation and return its job id immediately.
+
+    With X-Request-Timeout the job is abandoned once that many seconds have
+    passed since submission, as nobody will be polling for it any more. The
+    job is charged to the caller's quota on submission; it runs in the job
+    workers, so it takes no in-flight slot here.
+    """
+    timeout = request_timeout(x_request_timeout)
+    engine = generation_engine(input_data, ENGINE_DEFAULT_MODE)
+    await admit_request(request, x_api_key, tokens=request_token_estimate(input_data, ENGINE_TOKEN_FACTORS[engine]), slots=0)
+    deadline_at = time.time() + timeout if timeout else None
+    job = await asyncio.to_thread(get_job_store().create, input_data.model_dump(), deadline_at)
+    if job_pool is not None:
+        job_pool.notify()
+    return JobStatus(**job)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(**job)
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-video-production/stream")
+async def generate_video_production_stream(input_data: VideoIdeaInput, request: Request, cache_control: Optional[str] = Header(None),
+                                           x_request_timeout: Optional[str] = Header(None), x_api_key: Optional[str] = Header(None)):
+    """Stream the package as server-sent events.
+
+    A `section` event is sent for each top-level key as soon as the model has
+    finished writing it, then one for each section computed server-side,
+    followed by one `complete` event carrying the validated package (or an
+    `error` event).
+    """
+    # The stream always makes one large call, so it shares packages with fast requests that do too
+    key = cache_key(input_data, "fast")
+    bypass_cache = wants_fresh(cache_control)
+    timeout = request_timeout(x_request_timeout)
+    # Refused before the stream starts, so the client gets a plain 429
+    admission = await admit_request(request, x_api_key, tokens=request_token_estimate(input_data))
+
+    async def events():
+        async with settled(admission):
+            with deadline_scope(timeout) as deadline:
+                try:
+                    cached = None
+                    if bypass_cache:
+                        production_cache.record_bypass()
+                    else:
+                        cached = await production_cache.get(key)
+                    if cached is not None:
+                        for section_key, value in cached.items():
+                            if section_key in PACKAGE_FLAGS:
+                                continue
+                            yield sse_event("section", {"key": section_key, "value": value})
+                        yield sse_event("complete", cached)
+                        return
+
+                    # A malformed member is set aside and repaired below, as on the non-streaming path
+                    parser = TopLevelObjectParser(skip_invalid=True)
+                    production_data = {}
+                    async for delta in stream_chat_completion(
+                        section="package",
+                        messages=build_fast_messages(input_data)
+                    ):
+                        for section_key, value in parser.feed(delta):
+                            if section_key == "screenplay":
+                                value = with_scene_timings(value, input_data)
+                            production_data[section_key] = value
+                            if section_key in VideoProductionOutput.model_fields and section_key not in PACKAGE_FLAGS + SERVER_SIDE_SECTIONS:
+                                yield sse_event("section", {"key": section_key, "value": value})
+                    # Server-side sections follow the ones the model wrote
+                    yield sse_event("section", {"key": "estimated_engagement", "value": engagement_estimate(input_data)})
+
+                    if parser.finished and not parser.invalid:
+                        with stage_timer("validation"):
+                            production_output = production_output_from_data(production_data, input_data)
+                    else:
+                        # Cut off (e.g. by max_tokens) or holding a malformed member: keep what arrived and fill in the rest
+                        if deadline is not None and not parser.finished:
+                            # The stream has no finish reason; under a deadline its max_tokens may have been cut
+                            deadline.degraded = True
+                        production_output = await complete_recovered_package(input_data, recover_members(parser, production_data))
+                    # Skips partial or deadline-degraded packages, and indexes the idea like the other paths
+                    await store_package(key, input_data, production_output, "fast")
+                    yield sse_event("complete", production_output.model_dump())
+                except Exception as e:
+                    print(f"Streaming generation failed: {str(e)}")
+                    yield sse_event("error", {"detail": f"AI generation failed: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def build_fast_messages(input_data: VideoIdeaInput) -> List[Dict]:
+    """Build the single-call prompt that asks for the whole package as one JSON object"""
+    return package_messages(input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
+
+def production_output_from_data(production_data: Dict, input_data: VideoIdeaInput) -> VideoProductionOutput:
+    """Validate parsed single-call JSON into a VideoProductionOutput, filling safe defaults and server-side sections"""
+    return VideoProductionOutput(
+        title=production_data.get("title", f"Amazing {input_data.idea} Guide"),
+        hook=production_data.get("hook", f"Want to learn about {input_data.idea}? Here's everything you need to know!"),
+        screenplay=with_scene_timings(production_data.get("screenplay", []), input_data),
+        shot_list=production_data.get("shot_list", []),
+        dialogue=production_data.get("dialogue", []),
+        camera_angles=production_data.get("camera_angles", []),
+        music_suggestions=production_data.get("music_suggestions", []),
+        thumbnail_concepts=production_data.get("thumbnail_concepts", []),
+        posting_strategy=production_data.get("posting_strategy", {}),
+        estimated_engagement=engagement_estimate(input_data)
+    )
 
 async def create_complete_production_fast(input_data: VideoIdeaInput) -> VideoProductionOutput:
     """Generate complete video production package using a single efficient OpenAI call"""
 
-    # Create comprehensive prompt for video production
-    # Convert duration to specific timing requirements
-    duration_mapping = {
-        "1-3 minutes": {"total_time": "3:00", "scenes": 4, "example_timing": "0:00-0:15, 0:15-1:30, 1:30-2:30, 2:30-3:00"},
-        "3-5 minutes": {"total_time": "5:00", "scenes": 5, "example_timing": "0:00-0:15, 0:15-1:30, 1:30-3:00, 3:00-4:30, 4:30-5:00"},
-        "5-10 minutes": {"total_time": "8:00", "scenes": 6, "example_timing": "0:00-0:30, 0:30-2:00, 2:00-4:00, 4:00-6:00, 6:00-7:30, 7:30-8:00"},
-        "10+ minutes": {"total_time": "12:00", "scenes": 7, "example_timing": "0:00-0:30, 0:30-2:30, 2:30-5:00, 5:00-7:30, 7:30-10:00, 10:00-11:30, 11:30-12:00"}
-    }
-
-    duration_info = duration_mapping.get(input_data.duration, duration_mapping["5-10 minutes"])
-
-    prompt = f"""
-    Create a complete video production package for the following idea:
-
-    Idea: {input_data.idea}
-    Platform: {input_data.platform}
-    Duration: {input_data.duration} (TOTAL VIDEO LENGTH: {duration_info['total_time']})
-    Target Audience: {input_data.target_audience}
-    Tone: {input_data.tone}
-
-    CRITICAL: The video must be exactly {duration_info['total_time']} long. Create {duration_info['scenes']} scenes that add up to this total duration.
-
-    Generate a comprehensive production package in JSON format with these exact keys:
-    {{
-        "title": "SEO-optimized title for {input_data.platform}",
-        "hook": "Compelling 15-second opening hook",
-        "screenplay": [
-            {{"scene": 1, "timing": "0:00-0:15", "description": "Opening", "action": "Detailed action"}},
-            {{"scene": 2, "timing": "0:15-1:30", "description": "Main content part 1", "action": "Detailed action"}},
-            {{"scene": 3, "timing": "1:30-3:00", "description": "Main content part 2", "action": "Detailed action"}},
-            {{"scene": 4, "timing": "3:00-4:30", "description": "Main content part 3", "action": "Detailed action"}},
-            {{"scene": 5, "timing": "4:30-{duration_info['total_time']}", "description": "Conclusion", "action": "Detailed action"}}
-        ],
-        "shot_list": [
-            {{"shot": 1, "type": "Wide shot", "description": "Description", "duration": "30 seconds", "purpose": "Establish scene"}}
-        ],
-        "dialogue": [
-            {{"speaker": "Host", "line": "Dialogue text", "timing": "0:00-0:05"}}
-        ],
-        "camera_angles": [
-            {{"angle": "Eye level", "movement": "Static", "purpose": "Natural perspective", "timing": "Opening"}}
-        ],
-        "music_suggestions": ["Upbeat background music", "Transition sound effects"],
-        "thumbnail_concepts": ["Eye-catching concept 1", "Concept 2"],
-        "posting_strategy": {{
-            "best_time": "Peak hours for {input_data.platform}",
-            "hashtags": ["#relevant", "#hashtags"],
-            "description": "Engaging description",
-            "engagement_tactics": ["Call to action", "Question for comments"]
-        }},
-        "estimated_engagement": {{
-            "views": "Estimated view count",
-            "likes": "Estimated likes",
-            "shares": "Estimated shares",
-            "comments": "Estimated comments"
-        }}
-    }}
-
-    IMPORTANT:
-    - Create exactly {duration_info['scenes']} scenes that total {duration_info['total_time']}
-    - Example timing structure: {duration_info['example_timing']}
-    - Each scene should be substantial and detailed for the {input_data.duration} duration
-    - Make it detailed, platform-specific, and actionable.
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert video production assistant. Always respond with valid JSON in the exact format requested."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=3000,
-            temperature=0.7
-        )
+        with stage_timer("prompt_build"):
+            messages = build_fast_messages(input_data)
+
+        with stage_timer("upstream_wait"):
+            response = await chat_completion(
+                section="package",
+                tier=input_data.duration,
+                messages=messages
+            )
 
         # Parse the JSON response
         import json
         content = response.choices[0].message.content
 
         # Clean up the response if it has markdown formatting
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "").strip()
-
-        production_data = json.loads(content)
+        with stage_timer("fence_strip"):
+            if content.startswith("```json"):
+                content = content.replace("```json", "").replace("```", "").strip()
+
+        with stage_timer("json_parse"):
+            try:
+                production_data = json.loads(content)
+            except ValueError:
+                recovered = None
+            else:
+                recovered = production_data if isinstance(production_data, dict) else None
+
+        if recovered is None:
+            # Truncated or wrapped in prose: salvage the complete sections instead of failing the package
+            with stage_timer("json_repair"):
+                try:
+                    recovered = recover_object(content)
+                except ValueError:
+                    repair_stats.record("failed")
+                    raise
+            return await complete_recovered_package(input_data, recovered)
 
         # Validate and return structured output
-        return VideoProductionOutput(
-            title=production_data.get("title", f"Amazing {input_data.idea} Guide"),
-            hook=production_data.get("hook", f"Want to learn about {input_data.idea}? Here's everything you need to know!"),
-            screenplay=production_data.get("screenplay", []),
-            shot_list=production_data.get("shot_list", []),
-            dialogue=production_data.get("dialogue", []),
-            camera_angles=production_data.get("camera_angles", []),
-            music_suggestions=production_data.get("music_suggestions", []),
-            thumbnail_concepts=production_data.get("thumbnail_concepts", []),
-            posting_strategy=production_data.get("posting_strategy", {}),
-            estimated_engagement=production_data.get("estimated_engagement", {})
-        )
+        with stage_timer("validation"):
+            return production_output_from_data(production_data, input_data)
 
     except Exception as e:
         print(f"Fast generation failed: {str(e)}")
@@ -152,142 +695,316 @@ async def create_complete_production_fast(input_data: VideoIdeaInput) -> VideoPr
 
 
 
-async def create_complete_production(input_data: VideoIdeaInput) -> VideoProductionOutput:
-    """Generate complete video production package using OpenAI"""
-    
-    # Create comprehensive prompt for video production
-    prompt = f"""
-    Create a complete video production package for the following idea:
-    
-    Idea: {input_data.idea}
-    Platform: {input_data.platform}
-    Duration: {input_data.duration}
-    Target Audience: {input_data.target_audience}
-    Tone: {input_data.tone}
-    
-    Generate a comprehensive production package including:
-    
-    1. TITLE: Catchy, SEO-optimized title
-    2. HOOK: Compelling first 15 seconds to grab attention
-    3. SCREENPLAY: Scene-by-scene breakdown with timing
-    4. SHOT_LIST: Detailed camera shots and angles
-    5. DIALOGUE: Complete script with natural conversations
-    6. CAMERA_ANGLES: Specific camera movements and positions
-    7. MUSIC_SUGGESTIONS: Background music recommendations
-    8. THUMBNAIL_CONCEPTS: Eye-catching thumbnail ideas
-    9. POSTING_STRATEGY: Best times, hashtags, descriptions
-    10. ESTIMATED_ENGAGEMENT: Predicted views, likes, shares
-    
-    Format the response as a detailed JSON structure.
+def deadline_cut_short(e: Exception) -> bool:
+    """Whether a failed generation is down to the request deadline: it ran out, or answers were cut to fit it"""
+    deadline = current_deadline()
+    return raised_from(e, DeadlineExceeded) is not None or (deadline is not None and deadline.degraded)
+
+def section_json(response) -> Any:
+    """Parse a section call's JSON. An answer cut off at max_tokens (e.g. cut to meet a deadline)
+    keeps its complete elements instead of failing the section."""
+    choice = response.choices[0]
+    try:
+        return json.loads(choice.message.content)
+    except ValueError:
+        if choice.finish_reason != "length":
+            raise
+        return loads_truncated(choice.message.content)
+
+async def complete_recovered_package(input_data: VideoIdeaInput, recovered: RecoveredObject) -> VideoProductionOutput:
+    """Build a package from a repaired response, regenerating only the sections it lost.
+
+    Sections that cannot be regenerated keep their truncated content or the
+    usual defaults, and the package is flagged partial.
+    """
+    section_names = [section.name for section in build_production_sections(input_data)]
+    missing = [name for name in section_names if name not in recovered.complete and name not in SERVER_SIDE_SECTIONS]
+    complete = {name: recovered.data[name] for name in recovered.complete}
+
+    regenerated = await generate_sections(input_data, missing, complete, skip_failures=True) if REPAIR_FOLLOWUP_CALLS else {}
+
+    sources = {}
+    for name in missing:
+        if name in regenerated:
+            sources[name] = "followup"
+        else:
+            sources[name] = "truncated" if recovered.data.get(name) else "default"
+
+    with stage_timer("validation"):
+        production_output = production_output_from_data({**recovered.data, **regenerated}, input_data)
+    production_output.missing_sections = [name for name, source in sources.items() if source != "followup"]
+    production_output.partial = bool(production_output.missing_sections)
+
+    repair_stats.record("partial" if production_output.partial else "complete", sources)
+    # The single call came back truncated or unparseable, which counts against the engine that made it
+    note_degraded()
+    print(f"Repaired package JSON: kept {len(complete)} sections, regenerated {len(regenerated)}, "
+          f"missing {production_output.missing_sections or 'none'}")
+    return production_output
+
+async def generate_sections(input_data: VideoIdeaInput, names: Iterable[str], known: Dict,
+                            skip_failures: bool = False, read_cache: bool = True) -> Dict:
+    """Generate only the named sections with focused calls, taking any other dependencies from `known`.
+
+    With `skip_failures`, a section that fails is left out instead of failing
+    the rest. With `read_cache=False` every section is generated afresh.
     """
-    
+    sections = [with_section_cache(section, input_data, read_cache) for section in build_production_sections(input_data) if section.name in names]
+    if skip_failures:
+        sections = [Section(section.name, skip_failure(section), section.deps, section.inputs) for section in sections]
+    if not sections:
+        return {}
+    results, timings = await run_sections(sections, SECTION_CONCURRENCY, initial=known)
+    print("Section timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+    return {name: value for name, value in results.items() if value is not None}
+
+def skip_failure(section: Section):
+    """Wrap a section's run so a failure yields None instead of raising"""
+    async def run(done):
+        try:
+            return await section.run(done)
+        except Exception as e:
+            print(f"Could not regenerate {section.name}: {str(e)}")
+            return None
+    return run
+
+async def create_complete_production(input_data: VideoIdeaInput, bypass_cache: bool = False) -> VideoProductionOutput:
+    """Generate complete video production package using OpenAI"""
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert video production assistant who creates comprehensive production packages for content creators. Always respond with detailed, actionable content in JSON format."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4000,
-            temperature=0.7
-        )
-        
-        # Parse the response and structure it
-        content = response.choices[0].message.content
-        
-        # Generate structured output
-        production_output = await structure_production_output(content, input_data)
+        # Generate every section with focused calls, running independent ones concurrently
+        production_output = await structure_production_output(input_data, bypass_cache)
         return production_output
-        
+
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating production: {str(e)}")
 
-async def structure_production_output(ai_content: str, input_data: VideoIdeaInput) -> VideoProductionOutput:
+# Request fields read by each section's prompt; a section's cache entry is keyed only on these
+ALL_INPUTS = ("idea", "platform", "duration", "target_audience", "tone")
+INPUTS_EXCEPT_DURATION = ("idea", "platform", "target_audience", "tone")
+FORECAST_INPUTS = ("platform", "duration", "target_audience", "tone")
+
+def build_production_sections(input_data: VideoIdeaInput) -> List[Section]:
+    """Declare each package section, the sections it depends on and the input fields it reads"""
+    return [
+        Section("title", lambda done: generate_title(input_data), inputs=INPUTS_EXCEPT_DURATION),
+        Section("hook", lambda done: generate_hook(input_data), inputs=INPUTS_EXCEPT_DURATION),
+        Section("screenplay", lambda done: generate_screenplay(input_data), inputs=ALL_INPUTS),
+        Section("shot_list", lambda done: generate_shot_list(input_data), inputs=ALL_INPUTS),
+        Section("dialogue", lambda done: generate_dialogue(input_data, done["screenplay"]), deps=("screenplay",), inputs=ALL_INPUTS),
+        Section("camera_angles", lambda done: generate_camera_angles(input_data), inputs=ALL_INPUTS),
+        Section("music_suggestions", lambda done: generate_music_suggestions(input_data), inputs=INPUTS_EXCEPT_DURATION),
+        Section("thumbnail_concepts", lambda done: generate_thumbnail_concepts(input_data), inputs=INPUTS_EXCEPT_DURATION),
+        Section("posting_strategy", lambda done: generate_posting_strategy(input_data), inputs=INPUTS_EXCEPT_DURATION),
+        Section("estimated_engagement", lambda done: generate_engagement_estimates(input_data), inputs=FORECAST_INPUTS),
+    ]
+
+def with_section_cache(section: Section, input_data: VideoIdeaInput, read_cache: bool = True) -> Section:
+    """Serve a section from the section cache when its inputs and dependencies are unchanged, storing fresh results"""
+    async def run(done):
+        key = section_cache_key(section.name, input_data, section.inputs, {dep: done[dep] for dep in section.deps})
+        if read_cache:
+            cached = await section_cache.get(section.name, key)
+            if cached is not None:
+                return cached
+        value = await section.run(done)
+        # Sections cut short to meet a deadline are not kept for other requests
+        deadline = current_deadline()
+        if value is not None and (deadline is None or not deadline.degraded):
+            await section_cache.set(key, value)
+        return value
+    return Section(section.name, run, section.deps, section.inputs)
+
+async def structure_production_output(input_data: VideoIdeaInput, bypass_cache: bool = False) -> VideoProductionOutput:
     """Structure the AI output into our defined format with enhanced AI generation"""
 
-    # Generate title with platform optimization
-    title_prompt = f"""Create a catchy, SEO-optimized title for {input_data.platform} about: {input_data.idea}
-
-    Platform: {input_data.platform}
-    Target audience: {input_data.target_audience}
-    Tone: {input_data.tone}
-
-    Make it clickable, include power words, and optimize for {input_data.platform} algorithm.
-    """
+    sections = [with_section_cache(section, input_data, read_cache=not bypass_cache) for section in build_production_sections(input_data)]
+    deadline = current_deadline()
+    if deadline is not None:
+        # Under a deadline a section that cannot be used leaves the package partial instead of failing it
+        sections = [Section(section.name, skip_failure(section), section.deps, section.inputs) for section in sections]
+    results, timings = await run_sections(sections, SECTION_CONCURRENCY)
+    print("Section timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+
+    missing = [name for name, value in results.items() if value is None]
+    if not missing:
+        return VideoProductionOutput(**results)
+    if deadline.expired() or all(name in missing for name in results if name not in SERVER_SIDE_SECTIONS):
+        raise DeadlineExceeded(f"Request deadline passed before {', '.join(missing)} finished")
+    with stage_timer("validation"):
+        production_output = production_output_from_data({name: value for name, value in results.items() if value is not None}, input_data)
+    production_output.missing_sections = missing
+    production_output.partial = True
+    return production_output
+
+# Platform the shared sections of a multi-platform package are written for
+SHARED_PLATFORM = "all platforms"
+# Sections a multi-platform package writes once for every platform
+MULTI_PLATFORM_SHARED_SECTIONS = ("screenplay", "shot_list", "dialogue", "camera_angles", "music_suggestions")
+
+async def create_multi_platform_production(body: MultiPlatformInput, platforms: List[str],
+                                           bypass_cache: bool = False) -> Dict[str, VideoProductionOutput]:
+    """Generate the shared sections once and the platform-specific ones per platform, all concurrently"""
+    shared_input = body.for_platform(SHARED_PLATFORM)
+    sections = [with_section_cache(section, shared_input, read_cache=not bypass_cache)
+                for section in build_production_sections(shared_input) if section.name in MULTI_PLATFORM_SHARED_SECTIONS]
+    sections.extend(Section(f"platform:{platform}", lambda done, platform=platform: generate_platform_pieces(body.for_platform(platform)))
+                    for platform in platforms)
 
-    title_response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": title_prompt}],
-        max_tokens=100
-    )
-    title = title_response.choices[0].message.content.strip()
+    try:
+        results, timings = await run_sections(sections, MULTI_PLATFORM_CONCURRENCY)
+    except Exception as e:
+        if deadline_cut_short(e):
+            raise DeadlineExceeded(f"Output cut short to meet the request deadline could not be used: {str(e)}") from e
+        raise HTTPException(status_code=500, detail=f"Error generating multi-platform production: {str(e)}")
+    print("Section timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+
+    shared = {name: results[name] for name in MULTI_PLATFORM_SHARED_SECTIONS}
+    packages = {}
+    with stage_timer("validation"):
+        for platform in platforms:
+            package = production_output_from_data({**shared, **results[f"platform:{platform}"]}, body.for_platform(platform))
+            # Cut down after validation, which would otherwise reset the scene timings to the duration plan
+            packages[platform] = VideoProductionOutput(**cut_down(package.model_dump(), PLATFORM_MAX_SECONDS.get(platform)))
+    return packages
+
+@timed_section("platform_adaptation")
+async def generate_platform_pieces(input_data: VideoIdeaInput) -> Dict:
+    """Generate the title, hook, thumbnails and posting strategy of one platform's package"""
+    try:
+        response = await chat_completion(
+            section="platform_adaptation",
+            tier=input_data.duration,
+            messages=platform_messages(input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
+        )
+        pieces = section_json(response)
+    except Exception as e:
+        print(f"Failed to adapt package for {input_data.platform}: {e}")
+        raise Exception(f"Failed to adapt package for {input_data.platform}")
+    return {key: pieces[key] for key in ("title", "hook", "thumbnail_concepts", "posting_strategy") if key in pieces}
 
-    # Generate compelling hook
-    hook_prompt = f"""Create a compelling 15-second hook for a {input_data.platform} video about: {input_data.idea}
+# Package-level sections a long-form package takes from the detailed-mode generators
+LONGFORM_SHARED_SECTIONS = ("camera_angles", "music_suggestions", "thumbnail_concepts", "posting_strategy")
 
-    Requirements:
-    - Grab attention in first 3 seconds
-    - Create curiosity gap
-    - Match {input_data.tone} tone
-    - Target {input_data.target_audience} audience
-    - Include pattern interrupt or surprising statement
+async def create_complete_production_longform(input_data: VideoIdeaInput, bypass_cache: bool = False) -> VideoProductionOutput:
+    """Generate a long video as an outline, then every scene in full in parallel.
 
-    Write the exact words the creator should say.
+    Each scene call writes one scene's action, dialogue and shots, so the
+    critical path is one outline call plus one scene call however many
+    scenes the video has. The package-level sections run alongside.
     """
+    plan = duration_plan(input_data.duration)
+    sections = [Section("outline", lambda done: generate_outline(input_data))]
+    for index in range(plan["scenes"]):
+        sections.append(Section(f"scene_{index + 1}", lambda done, index=index: generate_scene(input_data, done["outline"], index), deps=("outline",)))
+    sections.extend(with_section_cache(section, input_data, read_cache=not bypass_cache)
+                    for section in build_production_sections(input_data) if section.name in LONGFORM_SHARED_SECTIONS)
 
-    hook_response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": hook_prompt}],
-        max_tokens=200
-    )
-    hook = hook_response.choices[0].message.content.strip()
-
-    # Convert duration to specific timing requirements for screenplay
-    duration_mapping = {
-        "1-3 minutes": {"total_time": "3:00", "scenes": 4, "scene_timings": ["0:00-0:15", "0:15-1:30", "1:30-2:30", "2:30-3:00"]},
-        "3-5 minutes": {"total_time": "5:00", "scenes": 5, "scene_timings": ["0:00-0:15", "0:15-1:30", "1:30-3:00", "3:00-4:30", "4:30-5:00"]},
-        "5-10 minutes": {"total_time": "8:00", "scenes": 6, "scene_timings": ["0:00-0:30", "0:30-2:00", "2:00-4:00", "4:00-6:00", "6:00-7:30", "7:30-8:00"]},
-        "10+ minutes": {"total_time": "12:00", "scenes": 7, "scene_timings": ["0:00-0:30", "0:30-2:30", "2:30-5:00", "5:00-7:30", "7:30-10:00", "10:00-11:30", "11:30-12:00"]}
+    try:
+        results, timings = await run_sections(sections, LONGFORM_CONCURRENCY)
+    except Exception as e:
+        if deadline_cut_short(e):
+            raise DeadlineExceeded(f"Output cut short to meet the request deadline could not be used: {str(e)}") from e
+        raise HTTPException(status_code=500, detail=f"Error generating long-form production: {str(e)}")
+    print("Section timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+
+    with stage_timer("validation"):
+        outline = results["outline"]
+        scenes = [results[f"scene_{index + 1}"] for index in range(plan["scenes"])]
+        shots = [shot for scene in scenes for shot in scene["shots"]]
+        shot_list = [{"shot": number, **{k: v for k, v in shot.items() if k != "shot"}} for number, shot in enumerate(shots, start=1)]
+        return production_output_from_data({
+            "title": outline.get("title"),
+            "hook": outline.get("hook"),
+            "screenplay": [{"description": entry["description"], "action": scene["action"]} for entry, scene in zip(outline["scenes"], scenes)],
+            "shot_list": shot_list,
+            "dialogue": [line for scene in scenes for line in scene["dialogue"]],
+            **{name: results[name] for name in LONGFORM_SHARED_SECTIONS}
+        }, input_data)
+
+@timed_section("outline")
+async def generate_outline(input_data: VideoIdeaInput) -> Dict:
+    """Generate a long-form video's title, hook and one outline entry per planned scene"""
+    plan = duration_plan(input_data.duration)
+    try:
+        response = await chat_completion(
+            section="outline",
+            tier=input_data.duration,
+            messages=outline_messages(input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
+        )
+        outline = section_json(response)
+        entries = [entry for entry in outline.get("scenes", []) if isinstance(entry, dict)]
+    except Exception as e:
+        print(f"Failed to generate outline: {e}")
+        raise Exception("Failed to generate outline")
+
+    # Exactly one entry per planned scene, each carrying its timing
+    scenes = []
+    for index, timing in enumerate(plan["scene_timings"]):
+        entry = entries[index] if index < len(entries) else {}
+        scenes.append({
+            "timing": timing,
+            "description": entry.get("description") or f"Scene {index + 1}",
+            "summary": entry.get("summary") or ""
+        })
+    return {"title": outline.get("title"), "hook": outline.get("hook"), "scenes": scenes}
+
+@timed_section("scene")
+async def generate_scene(input_data: VideoIdeaInput, outline: Dict, index: int) -> Dict:
+    """Write one outlined scene in full: its action, dialogue and shots"""
+    try:
+        response = await chat_completion(
+            section="scene",
+            tier=input_data.duration,
+            messages=scene_messages(input_data.idea, input_data.platform, input_data.target_audience, input_data.tone, outline["scenes"], index)
+        )
+        scene = section_json(response)
+    except Exception as e:
+        print(f"Failed to generate scene {index + 1}: {e}")
+        raise Exception(f"Failed to generate scene {index + 1}")
+    return {
+        "action": scene.get("action", ""),
+        "dialogue": [line for line in scene.get("dialogue", []) if isinstance(line, dict)],
+        "shots": [shot for shot in scene.get("shots", []) if isinstance(shot, dict)]
     }
 
-    duration_info = duration_mapping.get(input_data.duration, duration_mapping["5-10 minutes"])
-
-    # Generate detailed screenplay using AI
-    screenplay_prompt = f"""Create a detailed scene-by-scene screenplay for: {input_data.idea}
-
-    Duration: {input_data.duration} (TOTAL LENGTH: {duration_info['total_time']})
-    Platform: {input_data.platform}
-    Tone: {input_data.tone}
-    Target audience: {input_data.target_audience}
-
-    CRITICAL: Create exactly {duration_info['scenes']} scenes that total {duration_info['total_time']} in length.
-    Use these exact timings: {', '.join(duration_info['scene_timings'])}
-
-    Create {duration_info['scenes']} scenes with:
-    - Scene number (1 to {duration_info['scenes']})
-    - Specific timing from the list above
-    - Scene description/title
-    - Detailed action description (substantial content for each time segment)
+@timed_section("title")
+async def generate_title(input_data: VideoIdeaInput) -> str:
+    """Generate a platform-optimized title using AI"""
+    title_response = await chat_completion(
+        section="title",
+        tier=input_data.duration,
+        messages=section_messages("TITLE", input_data.idea, input_data.platform, None, input_data.target_audience, input_data.tone)
+    )
+    return title_response.choices[0].message.content.strip()
+
+@timed_section("hook")
+async def generate_hook(input_data: VideoIdeaInput) -> str:
+    """Generate a compelling opening hook using AI"""
+    hook_response = await chat_completion(
+        section="hook",
+        tier=input_data.duration,
+        messages=section_messages("HOOK", input_data.idea, input_data.platform, None, input_data.target_audience, input_data.tone)
+    )
+    return hook_response.choices[0].message.content.strip()
 
-    Format as JSON array with keys: scene, timing, description, action
-    Make it engaging and optimized for {input_data.platform}.
-    Each scene should have enough content to fill its allocated time slot.
-    """
+@timed_section("screenplay")
+async def generate_screenplay(input_data: VideoIdeaInput) -> List[Dict]:
+    """Generate a scene-by-scene screenplay using AI"""
 
     try:
-        screenplay_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional screenwriter. Create detailed, engaging screenplays for video content. Always respond with valid JSON."},
-                {"role": "user", "content": screenplay_prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
+        screenplay_response = await chat_completion(
+            section="screenplay",
+            tier=input_data.duration,
+            messages=screenplay_messages(input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
         )
 
         try:
             import json
-            screenplay = json.loads(screenplay_response.choices[0].message.content)
+            screenplay = section_json(screenplay_response)
+            return with_scene_timings(screenplay, input_data)
         except Exception as e:
             print(f"Failed to parse screenplay JSON: {e}")
             raise Exception("Failed to generate screenplay")
@@ -295,73 +1012,20 @@ async def structure_production_output(ai_content: str, input_data: VideoIdeaInpu
         print(f"Failed to generate screenplay: {e}")
         raise Exception("Failed to generate screenplay")
 
-    # Generate comprehensive shot list
-    shot_list = await generate_shot_list(input_data)
-
-    # Generate dialogue
-    dialogue = await generate_dialogue(input_data, screenplay)
-
-    # Generate camera angles
-    camera_angles = await generate_camera_angles(input_data)
-
-    # Generate music suggestions
-    music_suggestions = await generate_music_suggestions(input_data)
-
-    # Generate thumbnail concepts
-    thumbnail_concepts = await generate_thumbnail_concepts(input_data)
-
-    # Generate posting strategy
-    posting_strategy = await generate_posting_strategy(input_data)
-
-    # Generate engagement estimates
-    estimated_engagement = await generate_engagement_estimates(input_data)
-
-    return VideoProductionOutput(
-        title=title,
-        hook=hook,
-        screenplay=screenplay,
-        shot_list=shot_list,
-        dialogue=dialogue,
-        camera_angles=camera_angles,
-        music_suggestions=music_suggestions,
-        thumbnail_concepts=thumbnail_concepts,
-        posting_strategy=posting_strategy,
-        estimated_engagement=estimated_engagement
-    )
-
+@timed_section("shot_list")
 async def generate_shot_list(input_data: VideoIdeaInput) -> List[Dict]:
     """Generate detailed shot list using AI"""
-    prompt = f"""Create a detailed shot list for a {input_data.platform} video about: {input_data.idea}
-
-    Duration: {input_data.duration}
-    Tone: {input_data.tone}
-    Target audience: {input_data.target_audience}
-
-    Generate 5-7 specific shots with:
-    - Shot number
-    - Shot type (close-up, medium, wide, over-shoulder, B-roll, etc.)
-    - Detailed description of what's being filmed
-    - Duration for each shot
-    - Purpose/reason for the shot
-
-    Format as a JSON array of objects with keys: shot, type, description, duration, purpose
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional cinematographer. Generate detailed, specific shot lists for video production. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=600,
-            temperature=0.7
+        response = await chat_completion(
+            section="shot_list",
+            tier=input_data.duration,
+            messages=section_messages("SHOT_LIST", input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
         )
 
         # Try to parse JSON response
         try:
             import json
-            shots = json.loads(response.choices[0].message.content)
+            shots = section_json(response)
             return shots
         except Exception as e:
             print(f"Failed to parse shot list JSON: {e}")
@@ -371,38 +1035,19 @@ async def generate_shot_list(input_data: VideoIdeaInput) -> List[Dict]:
         print(f"Failed to generate shot list: {e}")
         raise Exception("Failed to generate shot list")
 
+@timed_section("dialogue")
 async def generate_dialogue(input_data: VideoIdeaInput, screenplay: List[Dict]) -> List[Dict]:
     """Generate natural dialogue for the video using AI"""
-    prompt = f"""Write natural, engaging dialogue for a {input_data.platform} video about: {input_data.idea}
-
-    Tone: {input_data.tone}
-    Target audience: {input_data.target_audience}
-    Duration: {input_data.duration}
-
-    Create 4-6 key dialogue lines that:
-    - Sound conversational and authentic
-    - Match the {input_data.tone} tone
-    - Are appropriate for {input_data.platform}
-    - Include specific timing (e.g., "0:00-0:05")
-    - Have natural transitions and flow
-
-    Format as JSON array with keys: speaker, line, timing
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional scriptwriter. Generate natural, engaging dialogue for video content. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=600,
-            temperature=0.7
+        response = await chat_completion(
+            section="dialogue",
+            tier=input_data.duration,
+            messages=dialogue_messages(input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone, screenplay)
         )
 
         try:
             import json
-            dialogue = json.loads(response.choices[0].message.content)
+            dialogue = section_json(response)
             return dialogue
         except Exception as e:
             print(f"Failed to parse dialogue JSON: {e}")
@@ -412,39 +1057,19 @@ async def generate_dialogue(input_data: VideoIdeaInput, screenplay: List[Dict])
         print(f"Failed to generate dialogue: {e}")
         raise Exception("Failed to generate dialogue")
 
+@timed_section("camera_angles")
 async def generate_camera_angles(input_data: VideoIdeaInput) -> List[Dict]:
     """Generate camera angles and movements using AI"""
-    prompt = f"""Generate professional camera angles and movements for a {input_data.platform} video about: {input_data.idea}
-
-    Video details:
-    - Platform: {input_data.platform}
-    - Duration: {input_data.duration}
-    - Tone: {input_data.tone}
-    - Target audience: {input_data.target_audience}
-
-    Create 5-6 specific camera setups including:
-    - Camera angle (eye level, high angle, low angle, over-shoulder, etc.)
-    - Camera movement (static, pan, tilt, zoom, dolly, etc.)
-    - Purpose/reason for this angle
-    - When to use it in the video
-
-    Format as JSON array with keys: angle, movement, purpose, timing
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional cinematographer. Generate specific camera angles and movements for video production. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
+        response = await chat_completion(
+            section="camera_angles",
+            tier=input_data.duration,
+            messages=section_messages("CAMERA_ANGLES", input_data.idea, input_data.platform, input_data.duration, input_data.target_audience, input_data.tone)
         )
 
         try:
             import json
-            angles = json.loads(response.choices[0].message.content)
+            angles = section_json(response)
             return angles
         except Exception as e:
             print(f"Failed to parse camera angles JSON: {e}")
@@ -454,34 +1079,14 @@ async def generate_camera_angles(input_data: VideoIdeaInput) -> List[Dict]:
         print(f"Failed to generate camera angles: {e}")
         raise Exception("Failed to generate camera angles")
 
+@timed_section("music_suggestions")
 async def generate_music_suggestions(input_data: VideoIdeaInput) -> List[str]:
     """Generate music suggestions using AI"""
-    prompt = f"""Generate specific music and audio suggestions for a {input_data.platform} video about: {input_data.idea}
-
-    Video details:
-    - Platform: {input_data.platform}
-    - Duration: {input_data.duration}
-    - Tone: {input_data.tone}
-    - Target audience: {input_data.target_audience}
-
-    Provide 5-7 specific music/audio suggestions including:
-    - Type of music (genre, mood, energy level)
-    - When to use it in the video (intro, background, outro, etc.)
-    - Platform-specific considerations
-    - Specific timing if relevant
-
-    Consider trending audio for {input_data.platform} and match the {input_data.tone} tone.
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a music supervisor for video content. Generate specific, actionable music suggestions for different platforms and content types."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=400,
-            temperature=0.7
+        response = await chat_completion(
+            section="music_suggestions",
+            tier=input_data.duration,
+            messages=section_messages("MUSIC_SUGGESTIONS", input_data.idea, input_data.platform, None, input_data.target_audience, input_data.tone)
         )
 
         # Parse the response into a list
@@ -500,34 +1105,14 @@ async def generate_music_suggestions(input_data: VideoIdeaInput) -> List[str]:
         print(f"Failed to generate music suggestions: {e}")
         raise Exception("Failed to generate music suggestions")
 
+@timed_section("thumbnail_concepts")
 async def generate_thumbnail_concepts(input_data: VideoIdeaInput) -> List[str]:
     """Generate thumbnail concepts using AI"""
-    prompt = f"""Generate creative thumbnail concepts for a {input_data.platform} video about: {input_data.idea}
-
-    Video details:
-    - Platform: {input_data.platform}
-    - Tone: {input_data.tone}
-    - Target audience: {input_data.target_audience}
-
-    Create 5-6 specific thumbnail concepts that:
-    - Are optimized for {input_data.platform}
-    - Match the {input_data.tone} tone
-    - Will attract the {input_data.target_audience} audience
-    - Include specific visual elements, colors, text placement
-    - Are designed for high click-through rates
-
-    Focus on what actually works on {input_data.platform} for this type of content.
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a thumbnail designer expert. Generate specific, actionable thumbnail concepts that drive clicks and engagement on different platforms."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=400,
-            temperature=0.7
+        response = await chat_completion(
+            section="thumbnail_concepts",
+            tier=input_data.duration,
+            messages=section_messages("THUMBNAIL_CONCEPTS", input_data.idea, input_data.platform, None, input_data.target_audience, input_data.tone)
         )
 
         # Parse the response into a list
@@ -546,39 +1131,19 @@ async def generate_thumbnail_concepts(input_data: VideoIdeaInput) -> List[str]:
         print(f"Failed to generate thumbnail concepts: {e}")
         raise Exception("Failed to generate thumbnail concepts")
 
+@timed_section("posting_strategy")
 async def generate_posting_strategy(input_data: VideoIdeaInput) -> Dict:
     """Generate platform-specific posting strategy using AI"""
-    prompt = f"""Generate a comprehensive posting strategy for a {input_data.platform} video about: {input_data.idea}
-
-    Video details:
-    - Platform: {input_data.platform}
-    - Duration: {input_data.duration}
-    - Tone: {input_data.tone}
-    - Target audience: {input_data.target_audience}
-
-    Provide specific strategy including:
-    - Best posting times for {input_data.platform}
-    - Relevant hashtags (5-10 specific ones for this content)
-    - Optimized description/caption
-    - Engagement tactics specific to {input_data.platform}
-
-    Format as JSON with keys: best_time, hashtags, description, engagement_tactics
-    """
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": f"You are a social media strategist expert in {input_data.platform}. Generate specific, actionable posting strategies. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
+        response = await chat_completion(
+            section="posting_strategy",
+            tier=input_data.duration,
+            messages=section_messages("POSTING_STRATEGY", input_data.idea, input_data.platform, None, input_data.target_audience, input_data.tone)
         )
 
         try:
             import json
-            strategy = json.loads(response.choices[0].message.content)
+            strategy = section_json(response)
             return strategy
         except Exception as e:
             print(f"Failed to parse posting strategy JSON: {e}")
@@ -588,31 +1153,149 @@ async def generate_posting_strategy(input_data: VideoIdeaInput) -> Dict:
         print(f"Failed to generate posting strategy: {e}")
         raise Exception("Failed to generate posting strategy")
 
+@timed_section("estimated_engagement")
 async def generate_engagement_estimates(input_data: VideoIdeaInput) -> Dict:
-    """Generate realistic engagement estimates"""
-    base_multipliers = {
-        "youtube": {"views": 1.0, "likes": 0.05, "shares": 0.01, "comments": 0.02},
-        "instagram": {"views": 0.8, "likes": 0.08, "shares": 0.02, "comments": 0.03},
-        "tiktok": {"views": 1.5, "likes": 0.1, "shares": 0.03, "comments": 0.04}
-    }
+    """Generate realistic engagement estimates from the forecasting coefficients"""
+    return engagement_estimate(input_data)
 
-    multiplier = base_multipliers.get(input_data.platform, base_multipliers["youtube"])
-    base_views = 25000  # Base estimate
+def engagement_estimate(input_data: VideoIdeaInput) -> Dict:
+    forecast = forecaster.forecast([input_data.platform], [input_data.duration], [input_data.target_audience], [input_data.tone])
+    return forecast.estimate(0)
 
-    return {
-        "views": f"{int(base_views * multiplier['views'] * 0.6)}-{int(base_views * multiplier['views'] * 1.5)}",
-        "likes": f"{int(base_views * multiplier['likes'] * 0.6)}-{int(base_views * multiplier['likes'] * 1.5)}",
-        "shares": f"{int(base_views * multiplier['shares'] * 0.6)}-{int(base_views * multiplier['shares'] * 1.5)}",
-        "comments": f"{int(base_views * multiplier['comments'] * 0.6)}-{int(base_views * multiplier['comments'] * 1.5)}",
-        "retention_rate": "65-80%" if input_data.platform == "youtube" else "70-85%"
-    }
+class EngagementForecastRequest(BaseModel):
+    platforms: List[str] = ["youtube", "instagram", "tiktok"]
+    durations: List[str] = ["1-3 minutes", "3-5 minutes", "5-10 minutes", "10+ minutes"]
+    target_audience: str = "general"
+    tone: str = "engaging"
+
+class EngagementForecastItem(BaseModel):
+    platform: str
+    duration: str
+    estimated_engagement: Dict
+
+@app.post("/engagement-forecast", response_model=List[EngagementForecastItem])
+async def engagement_forecast(body: EngagementForecastRequest):
+    """Engagement estimates for every platform x duration combination, platform-major.
+
+    Computed from the coefficient tables alone, so comparing options costs no LLM calls.
+    """
+    combinations = len(body.platforms) * len(body.durations)
+    if combinations > FORECAST_MAX_COMBINATIONS:
+        raise HTTPException(status_code=413, detail=f"Forecast grid too large: {combinations} combinations (max {FORECAST_MAX_COMBINATIONS})")
+    return forecaster.grid(body.platforms, body.durations, body.target_audience, body.tone)
+
+class SimilarPackage(BaseModel):
+    idea: str
+    score: float
+    package: VideoProductionOutput
 
+@app.post("/similar-packages", response_model=List[SimilarPackage])
+async def similar_packages(input_data: VideoIdeaInput, limit: int = Query(3, ge=1, le=20)):
+    """Previously generated packages for near-duplicate ideas with the same settings, best match first.
 
+    Lets a client offer an existing package before paying for a new one.
+    """
+    if not SIMILARITY_ENABLED:
+        return []
+    # Offered whichever engine generated them
+    matches = await similar_package(input_data, ["fast", "detailed", "longform", "auto"], SIMILARITY_OFFER_THRESHOLD, limit)
+    return [SimilarPackage(idea=match.idea, score=match.score, package=package) for match, package in matches]
+
+class SectionRegenerationRequest(BaseModel):
+    input: VideoIdeaInput
+    package: VideoProductionOutput
+    sections: List[str]
+
+@app.post("/regenerate-sections", response_model=VideoProductionOutput)
+async def regenerate_sections(body: SectionRegenerationRequest, request: Request, response: Response,
+                              x_request_timeout: Optional[str] = Header(None), x_api_key: Optional[str] = Header(None)):
+    """Re-run only the chosen sections of an existing package and return the merged package.
+
+    Sections that depend on a chosen one (dialogue on screenplay) are re-run
+    as well; every other section is kept as it was.
+    """
+    sections = build_production_sections(body.input)
+    section_names = [section.name for section in sections]
+    unknown = [name for name in body.sections if name not in section_names]
+    if unknown or not body.sections:
+        raise HTTPException(status_code=422, detail=f"Unknown or missing sections: {unknown}. Choose from {section_names}")
+
+    selected = with_dependents(sections, body.sections)
+    package = body.package.model_dump()
+    timeout = request_timeout(x_request_timeout)
+    # Charged as the share of a detailed package that is re-run
+    tokens = request_token_estimate(body.input, ENGINE_TOKEN_FACTORS["detailed"] * len(selected) / len(sections))
+    admission = await admit_request(request, x_api_key, tokens=tokens)
+    async with settled(admission):
+        with deadline_scope(timeout) as deadline:
+            try:
+                # The client asked for new content, so cached sections are not reused
+                regenerated = await until_deadline_or_disconnect(
+                    request, generate_sections(body.input, selected, package, read_cache=False), deadline
+                )
+            except Exception as e:
+                print(f"Section regeneration failed: {str(e)}")
+                raise generation_error(e, deadline)
+
+    missing = [name for name in body.package.missing_sections if name not in regenerated]
+    response.headers["X-Regenerated-Sections"] = ",".join(name for name in section_names if name in regenerated)
+    return VideoProductionOutput(**{**package, **regenerated, "partial": bool(missing), "missing_sections": missing})
 
 @app.get("/")
 async def root():
     return {"message": "AI Video Production Assistant API"}
 
+@registry.collector
+def runtime_gauges():
+    cache_stats = production_cache.stats()
+    flight_stats = inflight_generations.stats()
+    lag_stats = loop_lag_monitor.stats()
+    limiter_stats = rate_limiter.stats()
+    gauges = [
+        ("vpa_cache_lookups", "Package cache lookups by result", {"result": "memory_hit"}, cache_stats["memory_hits"]),
+        ("vpa_cache_lookups", "Package cache lookups by result", {"result": "disk_hit"}, cache_stats["disk_hits"]),
+        ("vpa_cache_lookups", "Package cache lookups by result", {"result": "miss"}, cache_stats["misses"]),
+        ("vpa_cache_lookups", "Package cache lookups by result", {"result": "bypass"}, cache_stats["bypasses"]),
+        ("vpa_cache_entries", "Packages held in the memory cache tier", {}, cache_stats["entries"]),
+        ("vpa_singleflight_requests", "Generation requests by single-flight role", {"role": "leader"}, flight_stats["leaders"]),
+        ("vpa_singleflight_requests", "Generation requests by single-flight role", {"role": "coalesced"}, flight_stats["coalesced"]),
+        ("vpa_event_loop_lag_ms", "Event-loop lag percentiles over the sampling window", {"quantile": "0.5"}, lag_stats["p50_ms"]),
+        ("vpa_event_loop_lag_ms", "Event-loop lag percentiles over the sampling window", {"quantile": "0.99"}, lag_stats["p99_ms"]),
+        ("vpa_rate_limit_concurrency_limit", "Current AIMD limit on concurrent upstream calls", {}, limiter_stats["concurrency_limit"]),
+        ("vpa_rate_limit_in_flight", "Upstream calls currently in flight", {}, limiter_stats["in_flight"]),
+        ("vpa_rate_limit_queue_depth", "Completion calls waiting for an upstream slot", {}, limiter_stats["queue_depth"]),
+        ("vpa_admission_in_flight", "Admission slots held by generation requests", {}, admission_controller.in_flight),
+        ("vpa_admission_queue_depth", "Generation requests queued for an admission slot", {}, admission_controller.queue_depth),
+    ]
+    for section, section_stats in section_cache.stats()["sections"].items():
+        gauges.append(("vpa_section_cache_lookups", "Section cache lookups by section and result", {"section": section, "result": "hit"}, section_stats["hits"]))
+        gauges.append(("vpa_section_cache_lookups", "Section cache lookups by section and result", {"section": section, "result": "miss"}, section_stats["misses"]))
+    return gauges
+
+@app.get("/metrics")
+async def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    return {
+        "cache": production_cache.stats(),
+        "section_cache": section_cache.stats(),
+        "similarity": idea_index.stats(),
+        "singleflight": inflight_generations.stats(),
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "hedging": hedger.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "routing": router.stats(),
+        "engine_selector": engine_selector.stats(),
+        "admission": await asyncio.to_thread(admission_controller.stats),
+        "json_repair": repair_stats.stats(),
+        "upstream_tokens": token_totals(),
+        "jobs": await asyncio.to_thread(get_job_store().counts)
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,261 @@
+"""
+Minimal Prometheus-style metrics for the API.
+
+Counters and histograms are kept in process and rendered in the Prometheus
+text exposition format on /metrics. With METRICS_ENABLED=0 every recording
+call returns immediately, so instrumentation on the hot path costs next to
+nothing.
+"""
+
+import bisect
+import functools
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Latency buckets in seconds, from sub-millisecond parsing up to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 20, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        series = self.values.get(key)
+        if series is None:
+            # Per-bucket counts followed by sum and count
+            series = self.values[key] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in self.values.items():
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets):
+                cumulative += series[index]
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {int(series[-1])}")
+        return lines
+
+
+class Registry:
+    """Holds metrics plus callbacks that report gauges computed at scrape time"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """Register fn() -> [(name, help, labels, value), ...] reported as gauges"""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        documented = set()
+        for fn in self.collectors:
+            for name, documentation, labels, value in fn():
+                if name not in documented:
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} gauge")
+                    documented.add(name)
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("vpa_stage_seconds", "Time spent in each generation stage")
+SECTION_SECONDS = registry.histogram("vpa_section_seconds", "Wall time of each package section generator")
+SECTION_FAILURES = registry.counter("vpa_section_failures_total", "Section generators that raised, e.g. on unparseable output")
+UPSTREAM_SECONDS = registry.histogram("vpa_upstream_seconds", "Upstream completion latency by section and model")
+UPSTREAM_REQUESTS = registry.counter("vpa_upstream_requests_total", "Upstream completion calls by section, model and outcome")
+UPSTREAM_TOKENS = registry.counter("vpa_upstream_tokens_total", "Upstream token usage by section and kind")
+HTTP_REQUEST_SECONDS = registry.histogram("vpa_http_request_seconds", "HTTP handler latency until response headers")
+
+
+def stage_timer(stage: str):
+    """Context manager timing one stage of the generation pipeline"""
+    if not METRICS_ENABLED:
+        return nullcontext()
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def timed_section(section: str):
+    """Decorator recording the wall time and failures of an async section generator"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return await fn(*args, **kwargs)
+            try:
+                with SECTION_SECONDS.time(section=section):
+                    return await fn(*args, **kwargs)
+            except Exception:
+                SECTION_FAILURES.inc(section=section)
+                raise
+        return wrapper
+    return decorator
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens the provider served from its prompt cache.
+
+    Older client versions keep `prompt_tokens_details` as a plain dict.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+_usage_tally: ContextVar[Optional[Dict[str, int]]] = ContextVar("usage_tally", default=None)
+
+
+@contextmanager
+def usage_tally(tally: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, int]]:
+    """Sum the tokens of every upstream call made inside the block, including calls in tasks it spawns.
+
+    Pass the tally of an enclosing block to charge work running in another context to it.
+    """
+    tally = tally if tally is not None else {"prompt": 0, "completion": 0}
+    token = _usage_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _usage_tally.reset(token)
+
+
+def current_usage_tally() -> Optional[Dict[str, int]]:
+    """Tally of the innermost usage_tally block, or None outside one"""
+    return _usage_tally.get()
+
+
+def record_usage(section: str, usage):
+    """Count prompt/completion/cached prompt tokens from a response's `usage` block"""
+    if usage is None:
+        return
+    tally = _usage_tally.get()
+    if tally is not None:
+        tally["prompt"] += getattr(usage, "prompt_tokens", 0) or 0
+        tally["completion"] += getattr(usage, "completion_tokens", 0) or 0
+    if not METRICS_ENABLED:
+        return
+    UPSTREAM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, section=section, kind="prompt")
+    UPSTREAM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, section=section, kind="completion")
+    UPSTREAM_TOKENS.inc(cached_prompt_tokens(usage), section=section, kind="cached_prompt")
+
+
+def token_totals() -> Dict[str, float]:
+    """Upstream tokens by kind across all sections, with the share of prompt tokens served from cache"""
+    totals = {"prompt": 0, "completion": 0, "cached_prompt": 0}
+    for key, value in UPSTREAM_TOKENS.values.items():
+        kind = dict(key).get("kind")
+        if kind in totals:
+            totals[kind] += value
+    totals["cached_prompt_ratio"] = round(totals["cached_prompt"] / totals["prompt"], 4) if totals["prompt"] else 0.0
+    return totals
+
+
+class RequestLatencyMiddleware:
+    """ASGI middleware timing each HTTP request until its response headers are sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # Label by route template so /jobs/{job_id} does not create a series per job
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    path=getattr(route, "path", "unmatched"),
+                    method=scope["method"],
+                    status=message["status"]
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,249 @@
+"""
+Prompt templates laid out for upstream prompt-prefix caching.
+
+Each task has a short static system message holding its role, format and
+rules, the same for every request. The platform, duration plan and the
+request's fields follow in the user message. Prompts are kept compact
+rather than padded: cached tokens are still billed and still count toward
+the rate-limit budget, and none of these system messages reaches OpenAI's
+1024-token caching minimum on its own.
+"""
+
+from typing import Dict, List, Optional
+
+# Scene layout for each duration; unknown durations use "5-10 minutes"
+DURATION_PLANS = {
+    "1-3 minutes": {"total_time": "3:00", "scenes": 4, "scene_timings": ["0:00-0:15", "0:15-1:30", "1:30-2:30", "2:30-3:00"]},
+    "3-5 minutes": {"total_time": "5:00", "scenes": 5, "scene_timings": ["0:00-0:15", "0:15-1:30", "1:30-3:00", "3:00-4:30", "4:30-5:00"]},
+    "5-10 minutes": {"total_time": "8:00", "scenes": 6, "scene_timings": ["0:00-0:30", "0:30-2:00", "2:00-4:00", "4:00-6:00", "6:00-7:30", "7:30-8:00"]},
+    "10+ minutes": {"total_time": "12:00", "scenes": 7, "scene_timings": ["0:00-0:30", "0:30-2:30", "2:30-5:00", "5:00-7:30", "7:30-10:00", "10:00-11:30", "11:30-12:00"]}
+}
+DEFAULT_DURATION = "5-10 minutes"
+
+
+def plan_tier(duration: str) -> str:
+    """Duration tier whose plan a request uses"""
+    return duration if duration in DURATION_PLANS else DEFAULT_DURATION
+
+
+def duration_plan(duration: str) -> Dict:
+    return DURATION_PLANS[plan_tier(duration)]
+
+
+def scene_timings_line(plan: Dict) -> str:
+    """Prompt line listing the scene timings; the stub backend reads it back"""
+    return f"Scene timings: {', '.join(plan['scene_timings'])}"
+
+
+# Static system message per task. Each holds only that task's role, format and rules, so calls send no text
+# they do not need. Nothing request-specific goes here: the platform and the duration plan are in the user
+# message, so each task's system message is the same for every request and cacheable by any provider whose
+# minimum it reaches (OpenAI's is 1024 tokens, longer than any of these).
+TASK_PROMPTS = {
+    "PACKAGE": """You are an expert video production assistant. Always respond with valid JSON in the exact format requested.
+
+Create a complete video production package for the platform named in the user message. Respond with a JSON object with these exact keys:
+{
+    "title": "SEO-optimized title for the platform",
+    "hook": "Compelling 15-second opening hook",
+    "screenplay": [
+        {"description": "Scene title", "action": "Detailed action"}
+    ],
+    "shot_list": [
+        {"shot": 1, "type": "Wide shot", "description": "Description", "duration": "30 seconds", "purpose": "Establish scene"}
+    ],
+    "dialogue": [
+        {"speaker": "Host", "line": "Dialogue text", "timing": "0:00-0:05"}
+    ],
+    "camera_angles": [
+        {"angle": "Eye level", "movement": "Static", "purpose": "Natural perspective", "timing": "Opening"}
+    ],
+    "music_suggestions": ["Upbeat background music", "Transition sound effects"],
+    "thumbnail_concepts": ["Eye-catching concept 1", "Concept 2"],
+    "posting_strategy": {
+        "best_time": "Peak hours for the platform",
+        "hashtags": ["#relevant", "#hashtags"],
+        "description": "Engaging description",
+        "engagement_tactics": ["Call to action", "Question for comments"]
+    }
+}
+
+IMPORTANT:
+- Write one screenplay scene per scene timing in the user message; each scene should have enough content to fill its time slot
+- Make it detailed, platform-specific, and actionable.""",
+
+    "SCREENPLAY": """You are a professional screenwriter. Create detailed, engaging screenplays for video content. Always respond with valid JSON.
+
+Write one scene per scene timing in the user message, in order. Give each scene a description/title and a detailed action description with substantial content for its time slot.
+
+Format as JSON array with keys: description, action
+Make it engaging and optimized for the platform.""",
+
+    "OUTLINE": """You are an expert video producer planning a long-form video. Always respond with valid JSON.
+
+Respond with a JSON object with these exact keys:
+{
+    "title": "SEO-optimized title for the platform",
+    "hook": "Compelling 15-second opening hook",
+    "scenes": [
+        {"description": "Scene title", "summary": "One or two sentences on what happens"}
+    ]
+}
+
+IMPORTANT:
+- Write one scene per scene timing in the user message, in order.
+- Keep each summary short; every scene is written in full separately.
+- The scenes must build on one another into one coherent video.""",
+
+    "SCENE": """You are a professional screenwriter writing one scene of a longer video. Always respond with valid JSON.
+
+Respond with a JSON object with these exact keys:
+{
+    "action": "Detailed action filling the whole time slot",
+    "dialogue": [
+        {"speaker": "Host", "line": "Dialogue text", "timing": "0:00-0:05"}
+    ],
+    "shots": [
+        {"type": "Wide shot", "description": "Description", "duration": "30 seconds", "purpose": "Establish scene"}
+    ]
+}
+
+IMPORTANT:
+- Dialogue timings must fall inside the scene's time slot.
+- Write enough dialogue and shots to fill the time slot.
+- Stay consistent with the video outline; do not repeat other scenes.""",
+
+    "PLATFORM_ADAPTATION": """You are a social media strategist adapting a finished video to one platform. Always respond with valid JSON.
+
+The screenplay, shots and dialogue are shared by every platform the video is published on. Write only the pieces specific to the platform in the user message, as a JSON object with these exact keys:
+{
+    "title": "SEO-optimized title for the platform",
+    "hook": "Compelling opening hook in the platform's style",
+    "thumbnail_concepts": ["Eye-catching concept 1", "Concept 2"],
+    "posting_strategy": {
+        "best_time": "Peak hours for the platform",
+        "hashtags": ["#relevant", "#hashtags"],
+        "description": "Engaging description",
+        "engagement_tactics": ["Call to action", "Question for comments"]
+    }
+}""",
+
+    "TITLE": """You write video titles. Create one catchy, SEO-optimized title for the platform in the user message. Make it clickable, include power words, and optimize it for the platform's algorithm. Respond with the title alone.""",
+
+    "HOOK": """You write video hooks. Create a compelling 15-second hook and write the exact words the creator should say.
+
+Requirements:
+- Grab attention in the first 3 seconds
+- Create a curiosity gap
+- Match the tone and target audience
+- Include a pattern interrupt or surprising statement""",
+
+    "SHOT_LIST": """You are a professional cinematographer. Generate detailed, specific shot lists for video production. Always respond with valid JSON.
+
+Generate 5-7 specific shots with a shot number, the shot type (close-up, medium, wide, over-shoulder, B-roll, etc.), a detailed description of what is filmed, its duration and its purpose.
+
+Format as a JSON array of objects with keys: shot, type, description, duration, purpose""",
+
+    "DIALOGUE": """You are a professional scriptwriter. Generate natural, engaging dialogue for video content. Always respond with valid JSON.
+
+Create 4-6 key dialogue lines that sound conversational and authentic, match the tone, suit the platform, have natural transitions and each include a timing (e.g. "0:00-0:05"). When screenplay scenes are listed, keep the lines in step with them.
+
+Format as JSON array with keys: speaker, line, timing""",
+
+    "CAMERA_ANGLES": """You are a professional cinematographer. Generate specific camera angles and movements for video production. Always respond with valid JSON.
+
+Create 5-6 camera setups, each with the angle (eye level, high angle, low angle, over-shoulder, etc.), the movement (static, pan, tilt, zoom, dolly, etc.), its purpose and when to use it in the video.
+
+Format as JSON array with keys: angle, movement, purpose, timing""",
+
+    "MUSIC_SUGGESTIONS": """You are a music supervisor for video content. Generate specific, actionable music suggestions for different platforms and content types.
+
+Provide 5-7 music/audio suggestions, one per line. Give the type of music (genre, mood, energy level), when to use it (intro, background, outro, etc.) and any specific timing. Consider the platform's trending audio and match the tone.""",
+
+    "THUMBNAIL_CONCEPTS": """You are a thumbnail designer expert. Generate specific, actionable thumbnail concepts that drive clicks and engagement on different platforms.
+
+Create 5-6 thumbnail concepts, one per line, with specific visual elements, colors and text placement. Match the tone, appeal to the target audience and design for a high click-through rate on the platform.""",
+
+    "POSTING_STRATEGY": """You are a social media strategist. Generate specific, actionable posting strategies. Always respond with valid JSON.
+
+Give the best posting times for the platform, 5-10 specific hashtags for this content, an optimized description/caption and engagement tactics specific to the platform.
+
+Format as JSON with keys: best_time, hashtags, description, engagement_tactics"""
+}
+
+
+def request_details(idea: str, platform: str, duration: Optional[str], target_audience: str, tone: str) -> str:
+    """The request's own fields; `duration` is left out for tasks that do not depend on it"""
+    lines = [f"Idea: {idea}", f"Platform: {platform}"]
+    if duration is not None:
+        lines.append(f"Duration: {duration}")
+    lines.extend([f"Target Audience: {target_audience}", f"Tone: {tone}"])
+    return "\n".join(lines)
+
+
+def plan_lines(duration: str) -> str:
+    """Total length and scene timings of the duration plan"""
+    plan = duration_plan(duration)
+    return f"TOTAL VIDEO LENGTH: {plan['total_time']}\nWrite exactly {plan['scenes']} scenes, in order, one per timing. {scene_timings_line(plan)}"
+
+
+def task_messages(task: str, *parts: str) -> List[Dict]:
+    """The task's static system message, then its request-specific parts"""
+    return [
+        {"role": "system", "content": TASK_PROMPTS[task]},
+        {"role": "user", "content": "\n\n".join(parts)}
+    ]
+
+
+def package_messages(idea: str, platform: str, duration: str, target_audience: str, tone: str) -> List[Dict]:
+    """Messages asking for the whole package as one JSON object"""
+    return task_messages("PACKAGE", plan_lines(duration), request_details(idea, platform, duration, target_audience, tone))
+
+
+def screenplay_messages(idea: str, platform: str, duration: str, target_audience: str, tone: str) -> List[Dict]:
+    """Messages asking for the screenplay alone"""
+    return task_messages("SCREENPLAY", plan_lines(duration), request_details(idea, platform, duration, target_audience, tone))
+
+
+def outline_messages(idea: str, platform: str, duration: str, target_audience: str, tone: str) -> List[Dict]:
+    """Messages asking for a long-form video's title, hook and scene outline"""
+    return task_messages("OUTLINE", plan_lines(duration), request_details(idea, platform, duration, target_audience, tone))
+
+
+def scene_messages(idea: str, platform: str, target_audience: str, tone: str,
+                   outline: List[Dict], index: int) -> List[Dict]:
+    """Messages asking for scene `index` of `outline` in full.
+
+    Each outline entry carries the scene's timing, description and summary.
+    """
+    scene = outline[index]
+    overview = "\n".join(f"{number}. {entry['timing']} {entry['description']}: {entry['summary']}"
+                         for number, entry in enumerate(outline, start=1))
+    return task_messages(
+        "SCENE",
+        request_details(idea, platform, None, target_audience, tone),
+        f"Video outline:\n{overview}",
+        f"Scene timing: {scene['timing']}\nWrite scene {index + 1} in full: {scene['description']}"
+    )
+
+
+def platform_messages(idea: str, platform: str, duration: str, target_audience: str, tone: str) -> List[Dict]:
+    """Messages asking for the platform-specific pieces of a multi-platform package"""
+    return task_messages("PLATFORM_ADAPTATION", request_details(idea, platform, duration, target_audience, tone))
+
+
+def section_messages(task: str, idea: str, platform: str, duration: Optional[str], target_audience: str, tone: str) -> List[Dict]:
+    """Messages asking for one detailed-mode section; `duration` is None for sections that do not read it"""
+    return task_messages(task, request_details(idea, platform, duration, target_audience, tone))
+
+
+def dialogue_messages(idea: str, platform: str, duration: str, target_audience: str, tone: str,
+                      screenplay: List[Dict]) -> List[Dict]:
+    """Messages asking for dialogue in step with the screenplay it is written for"""
+    parts = [request_details(idea, platform, duration, target_audience, tone)]
+    scenes = [scene for scene in screenplay or [] if isinstance(scene, dict)]
+    if scenes:
+        parts.append("Screenplay scenes to write for:\n" + "\n".join(
+            f"- {scene.get('timing', '')} {scene.get('description', '')}".rstrip() for scene in scenes
+        ))
+    return task_messages("DIALOGUE", *parts)
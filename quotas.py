@@ -0,0 +1,335 @@
+"""
+Admission control for the generation endpoints.
+
+Each client (its X-API-Key, or its address when it sends none) has two
+token buckets: one counted in requests and one in estimated LLM tokens. A
+request that would overdraw either is refused at once with a 429 and a
+Retry-After. A large batch may take a bucket below zero; the client then
+waits until it has refilled. The token charge is an estimate made before
+generation. It is settled against the tokens actually used once the
+request finishes. Buckets live in memory, or in SQLite (QUOTA_DB_PATH) so
+that every worker on the host shares them.
+
+Admitted requests then take a slot under a global in-flight cap. When all
+slots are busy they wait in a bounded queue, and are refused with a 429 if
+the queue is full or the wait runs out.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import registry
+
+# Per-client limits; a rate of 0 (the default) turns that bucket off. Off by default because clients
+# without an X-API-Key are told apart by address, and every user of the Streamlit frontend shares one
+QUOTA_REQUESTS_PER_MINUTE = float(os.getenv("QUOTA_REQUESTS_PER_MINUTE", "0"))
+QUOTA_REQUEST_BURST = float(os.getenv("QUOTA_REQUEST_BURST", "20"))
+QUOTA_TOKENS_PER_MINUTE = float(os.getenv("QUOTA_TOKENS_PER_MINUTE", "0"))
+QUOTA_TOKEN_BURST = float(os.getenv("QUOTA_TOKEN_BURST", "100000"))
+# SQLite file shared by the workers on this host (unset = per-process memory)
+QUOTA_DB_PATH = os.getenv("QUOTA_DB_PATH") or None
+# Idle clients kept in memory before full buckets are dropped
+QUOTA_MAX_CLIENTS = int(os.getenv("QUOTA_MAX_CLIENTS", "10000"))
+
+# Generation requests handled at once by this process (0 = no cap), and how many may queue for a slot
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+# Retry-After sent when the server, rather than the client's quota, is full
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+ADMISSION_REJECTIONS = registry.counter("vpa_admission_rejections_total", "Requests refused by admission control by reason")
+ADMISSION_WAIT_SECONDS = registry.histogram("vpa_admission_wait_seconds", "Time admitted requests queued for an in-flight slot")
+
+# Bucket kinds, in the order their limits are listed
+KINDS = ("requests", "tokens")
+
+
+class QuotaExceeded(Exception):
+    """A request was refused by admission control"""
+
+    def __init__(self, message: str, retry_after: float, reason: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def client_id(api_key: Optional[str], address: Optional[str]) -> str:
+    """Quota identity: a hash of the API key, so keys are never stored, or the client address"""
+    if api_key and api_key.strip():
+        return "key:" + hashlib.sha256(api_key.strip().encode("utf-8")).hexdigest()[:16]
+    return f"addr:{address or 'unknown'}"
+
+
+class BucketLimits:
+    """Refill rate (per second) and capacity of each bucket kind that is switched on"""
+
+    def __init__(self, requests_per_minute: float, request_burst: float, tokens_per_minute: float, token_burst: float):
+        self.limits: Dict[str, Tuple[float, float]] = {}
+        for kind, per_minute, burst in (("requests", requests_per_minute, request_burst), ("tokens", tokens_per_minute, token_burst)):
+            if per_minute > 0:
+                self.limits[kind] = (per_minute / 60, max(burst, 1.0))
+
+    def refill(self, kind: str, level: float, updated_at: float, now: float) -> float:
+        rate, capacity = self.limits[kind]
+        return min(capacity, level + max(0.0, now - updated_at) * rate)
+
+    def shortfall_wait(self, levels: Dict[str, float], costs: Dict[str, float]) -> Tuple[float, Optional[str]]:
+        """(seconds until every bucket can pay its cost, the bucket that takes longest) or (0, None).
+
+        A cost above a bucket's capacity only needs a full bucket; paying it takes the bucket below zero.
+        """
+        wait, reason = 0.0, None
+        for kind, (rate, capacity) in self.limits.items():
+            needed = min(costs.get(kind, 0), capacity)
+            if levels[kind] < needed:
+                kind_wait = (needed - levels[kind]) / rate
+                if kind_wait > wait:
+                    wait, reason = kind_wait, kind
+        return wait, reason
+
+
+class MemoryBuckets:
+    """Buckets for one process"""
+
+    def __init__(self, limits: BucketLimits, max_clients: int = QUOTA_MAX_CLIENTS):
+        self.limits = limits
+        self.max_clients = max_clients
+        # client -> kind -> (level, updated_at)
+        self._buckets: Dict[str, Dict[str, Tuple[float, float]]] = {}
+
+    def _levels(self, client: str, now: float) -> Dict[str, float]:
+        stored = self._buckets.get(client, {})
+        levels = {}
+        for kind, (_, capacity) in self.limits.limits.items():
+            level, updated_at = stored.get(kind, (capacity, now))
+            levels[kind] = self.limits.refill(kind, level, updated_at, now)
+        return levels
+
+    def _store(self, client: str, levels: Dict[str, float], now: float):
+        self._buckets[client] = {kind: (level, now) for kind, level in levels.items()}
+        if len(self._buckets) > self.max_clients:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        # A client whose buckets have refilled is indistinguishable from a new one
+        for client in list(self._buckets):
+            levels = self._levels(client, now)
+            if all(levels[kind] >= capacity for kind, (_, capacity) in self.limits.limits.items()):
+                del self._buckets[client]
+
+    def take(self, client: str, costs: Dict[str, float]) -> Tuple[float, Optional[str]]:
+        now = time.time()
+        levels = self._levels(client, now)
+        wait, reason = self.limits.shortfall_wait(levels, costs)
+        if wait == 0:
+            self._store(client, {kind: level - costs.get(kind, 0) for kind, level in levels.items()}, now)
+        return wait, reason
+
+    def adjust(self, client: str, kind: str, amount: float):
+        """Add `amount` (negative to charge more) to one of a client's buckets"""
+        if kind not in self.limits.limits:
+            return
+        now = time.time()
+        levels = self._levels(client, now)
+        levels[kind] = min(self.limits.limits[kind][1], levels[kind] + amount)
+        self._store(client, levels, now)
+
+    def clients(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBuckets(MemoryBuckets):
+    """Buckets in a SQLite file, so every worker on the host draws on the same quota"""
+
+    def __init__(self, limits: BucketLimits, db_path: str):
+        super().__init__(limits)
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quota_buckets ("
+                "client TEXT NOT NULL, kind TEXT NOT NULL, level REAL NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (client, kind))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def _update(self, client: str, change) -> Tuple[float, Optional[str]]:
+        """Read a client's levels, let `change(levels, now)` return new levels (or None) and a result, write them back"""
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers cannot both spend the same budget
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            stored = {kind: (level, updated_at) for kind, level, updated_at in conn.execute(
+                "SELECT kind, level, updated_at FROM quota_buckets WHERE client = ?", (client,)
+            )}
+            levels = {}
+            for kind, (_, capacity) in self.limits.limits.items():
+                level, updated_at = stored.get(kind, (capacity, now))
+                levels[kind] = self.limits.refill(kind, level, updated_at, now)
+            new_levels, result = change(levels)
+            if new_levels is not None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO quota_buckets (client, kind, level, updated_at) VALUES (?, ?, ?, ?)",
+                    [(client, kind, level, now) for kind, level in new_levels.items()]
+                )
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def take(self, client: str, costs: Dict[str, float]) -> Tuple[float, Optional[str]]:
+        def change(levels):
+            wait, reason = self.limits.shortfall_wait(levels, costs)
+            if wait:
+                return None, (wait, reason)
+            return {kind: level - costs.get(kind, 0) for kind, level in levels.items()}, (0.0, None)
+        return self._update(client, change)
+
+    def adjust(self, client: str, kind: str, amount: float):
+        if kind not in self.limits.limits:
+            return
+
+        def change(levels):
+            levels[kind] = min(self.limits.limits[kind][1], levels[kind] + amount)
+            return levels, None
+        self._update(client, change)
+
+    def clients(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(DISTINCT client) FROM quota_buckets").fetchone()[0]
+
+
+class Admission:
+    """One admitted request: its quota charge and in-flight slots, given back by `release`"""
+
+    def __init__(self, controller: "AdmissionController", client: str, tokens: float, slots: int):
+        self.controller = controller
+        self.client = client
+        self.tokens = tokens
+        self.slots = slots
+        self.released = False
+
+    async def release(self, used_tokens: Optional[float] = None):
+        """Free the slots and, given the tokens the request really used, settle the token charge"""
+        if self.released:
+            return
+        self.released = True
+        await self.controller._release(self, used_tokens)
+
+
+class AdmissionController:
+    """Per-client token buckets in front of a global in-flight cap with a bounded wait queue"""
+
+    def __init__(self, buckets: MemoryBuckets, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.buckets = buckets
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queue_depth = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _reject(self, message: str, retry_after: float, reason: str) -> QuotaExceeded:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        return QuotaExceeded(message, retry_after, reason)
+
+    async def _call(self, fn, *args):
+        # SQLite may wait on another worker's lock, so keep it off the event loop
+        if isinstance(self.buckets, SQLiteBuckets):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def admit(self, client: str, requests: float = 1, tokens: float = 0, slots: int = 1) -> Admission:
+        """Charge `client` for `requests` and an estimate of `tokens`, then hold `slots` in-flight slots.
+
+        `slots=0` only charges the quota, for work queued elsewhere. Raises QuotaExceeded when refused.
+        """
+        wait, kind = await self._call(self.buckets.take, client, {"requests": requests, "tokens": tokens})
+        if wait:
+            raise self._reject(f"Quota exceeded for {kind}; retry in {wait:.1f}s", wait, f"quota_{kind}")
+
+        admission = Admission(self, client, tokens, 0)
+        if slots and self.max_in_flight > 0:
+            try:
+                admission.slots = await self._acquire(min(slots, self.max_in_flight))
+            except QuotaExceeded:
+                # Nothing was generated, so the client keeps its quota
+                await self._call(self.buckets.adjust, client, "requests", requests)
+                await self._call(self.buckets.adjust, client, "tokens", tokens)
+                raise
+        self.admitted += 1
+        return admission
+
+    async def _acquire(self, slots: int) -> int:
+        condition = self._cond()
+        async with condition:
+            if self.in_flight + slots <= self.max_in_flight and self.queue_depth == 0:
+                self.in_flight += slots
+                ADMISSION_WAIT_SECONDS.observe(0.0)
+                return slots
+            if self.queue_depth >= self.max_queue:
+                raise self._reject("Server is at capacity; the admission queue is full", ADMISSION_RETRY_AFTER, "queue_full")
+            self.queue_depth += 1
+            self.queued += 1
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(condition.wait_for(lambda: self.in_flight + slots <= self.max_in_flight),
+                                       self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject(f"Server is at capacity; no slot freed up within {self.queue_timeout:g}s",
+                                   ADMISSION_RETRY_AFTER, "queue_timeout")
+            finally:
+                self.queue_depth -= 1
+            self.in_flight += slots
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start)
+            return slots
+
+    async def _release(self, admission: Admission, used_tokens: Optional[float]):
+        if admission.slots:
+            condition = self._cond()
+            async with condition:
+                self.in_flight -= admission.slots
+                condition.notify_all()
+        if used_tokens is not None and used_tokens != admission.tokens:
+            # Refund an overestimate, or charge the difference for an underestimate
+            await self._call(self.buckets.adjust, admission.client, "tokens", admission.tokens - used_tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "limits": {kind: {"per_minute": rate * 60, "burst": capacity} for kind, (rate, capacity) in self.buckets.limits.limits.items()},
+            "clients": self.buckets.clients(),
+            "persistent": isinstance(self.buckets, SQLiteBuckets)
+        }
+
+
+_limits = BucketLimits(QUOTA_REQUESTS_PER_MINUTE, QUOTA_REQUEST_BURST, QUOTA_TOKENS_PER_MINUTE, QUOTA_TOKEN_BURST)
+admission_controller = AdmissionController(SQLiteBuckets(_limits, QUOTA_DB_PATH) if QUOTA_DB_PATH else MemoryBuckets(_limits))
@@ -0,0 +1,335 @@
+"""
+Scheduler for every upstream completion call.
+
+Calls take a slot before going upstream. The number of slots adapts with
+AIMD: it grows by about one per window of successful calls and halves on a
+429, up to OPENAI_MAX_CONCURRENCY. The remaining request and token budget
+reported in the provider's x-ratelimit-* response headers is tracked too. A
+call that would overdraw it waits in the queue until the budget resets
+instead of being sent to fail. Calls that still fail with 429, 5xx or a
+connection error are retried with jittered exponential backoff, honouring
+Retry-After.
+"""
+
+import asyncio
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Mapping, Optional
+
+import openai
+
+from deadlines import DeadlineExceeded, current_deadline
+from metrics import registry
+
+RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "10"))
+RATE_LIMIT_MIN_CONCURRENCY = int(os.getenv("RATE_LIMIT_MIN_CONCURRENCY", "1"))
+# Multiplicative decrease applied to the concurrency limit on a 429
+RATE_LIMIT_DECREASE = float(os.getenv("RATE_LIMIT_DECREASE", "0.5"))
+# Further 429s within this many seconds of a decrease do not shrink the limit again
+RATE_LIMIT_DECREASE_COOLDOWN = float(os.getenv("RATE_LIMIT_DECREASE_COOLDOWN", "1.0"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "8"))
+# Longest a call queues for the budget to come back; longer waits fail fast with a Retry-After
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+
+# Rough characters-per-token ratio for estimating a call's token cost before sending it
+CHARS_PER_TOKEN = 4
+
+RATE_LIMIT_WAIT_SECONDS = registry.histogram("vpa_rate_limit_wait_seconds", "Time completion calls spent queued for an upstream slot")
+RATE_LIMIT_THROTTLES = registry.counter("vpa_rate_limit_throttles_total", "Upstream 429 responses")
+UPSTREAM_RETRIES = registry.counter("vpa_upstream_retries_total", "Retried upstream calls by section and reason (429, 5xx, connection)")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class SlotUnavailable(Exception):
+    """No upstream slot was free for a call that must not queue"""
+
+
+class UpstreamRateLimited(Exception):
+    """The provider kept answering 429, or its budget will not come back soon enough to wait for"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(kwargs: Mapping[str, Any]) -> int:
+    """Tokens a call counts against a token-per-minute limit: its prompt plus max_tokens"""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+    return prompt_chars // CHARS_PER_TOKEN + int(kwargs.get("max_tokens") or 0)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit reset value such as "20ms", "1.5s" or "6m0s" """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def error_status(e: BaseException) -> Optional[int]:
+    return getattr(e, "status_code", None)
+
+
+def error_headers(e: BaseException) -> Mapping[str, str]:
+    headers = getattr(e, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    return headers or {}
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds a Retry-After (or retry-after-ms) header asks the client to wait"""
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    seconds = headers.get("retry-after")
+    if seconds:
+        try:
+            return float(seconds)
+        except ValueError:
+            return None
+    return None
+
+
+class RateLimitScheduler:
+    """AIMD concurrency limit, header-driven budget tracking and retries for upstream calls"""
+
+    def __init__(self, max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY, min_concurrency: int = RATE_LIMIT_MIN_CONCURRENCY,
+                 max_retries: int = RATE_LIMIT_MAX_RETRIES, rng: Optional[random.Random] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.rng = rng or random.Random()
+        self._condition: Optional[asyncio.Condition] = None
+        self._last_decrease = 0.0
+        # Budget from the latest x-ratelimit-* headers, debited locally for calls sent since
+        self.remaining_requests: Optional[float] = None
+        self.remaining_tokens: Optional[float] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        # Budget regained per second, when the headers also report the limit
+        self.requests_refill: Optional[float] = None
+        self.tokens_refill: Optional[float] = None
+        # Set from Retry-After on a 429; nothing is sent before it
+        self.paused_until = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.calls = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.throttles = 0
+        self.retries = 0
+        self.budget_waits = 0
+
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @staticmethod
+    def _refill_wait(remaining: Optional[float], needed: float, reset_at: float, refill: Optional[float], now: float) -> float:
+        """Seconds until `needed` units of one budget are available: the full reset, or sooner at the refill rate"""
+        if remaining is None or remaining >= needed or reset_at <= now:
+            return 0.0
+        wait = reset_at - now
+        if refill:
+            wait = min(wait, (needed - remaining) / refill)
+        return wait
+
+    def _budget_wait(self, tokens: int) -> float:
+        """Seconds until the tracked budget can take a call of `tokens`, 0 if it can now"""
+        now = time.monotonic()
+        return max(
+            self.paused_until - now,
+            self._refill_wait(self.remaining_requests, 1, self.requests_reset_at, self.requests_refill, now),
+            self._refill_wait(self.remaining_tokens, tokens, self.tokens_reset_at, self.tokens_refill, now),
+            0.0
+        )
+
+    def has_free_slot(self, tokens: int = 0) -> bool:
+        """True when a call of `tokens` could go upstream now without queueing behind anything"""
+        return self.queue_depth == 0 and self.in_flight < max(1, int(self.limit)) and self._budget_wait(tokens) == 0
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, wait: bool = True):
+        """Hold one upstream slot for the body, queueing while the limit or the budget is exhausted.
+
+        With `wait=False` the call does not queue: SlotUnavailable is raised unless a slot is free now.
+        """
+        condition = self._cond()
+        start = time.monotonic()
+        deadline = current_deadline()
+        async with condition:
+            waited = False
+            while True:
+                budget_wait = self._budget_wait(tokens)
+                if self.in_flight < max(1, int(self.limit)) and budget_wait == 0:
+                    break
+                if not wait:
+                    raise SlotUnavailable("No upstream slot is free")
+                if not waited:
+                    waited = True
+                    self.queued += 1
+                    self.queue_depth += 1
+                    self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+                    if budget_wait:
+                        self.budget_waits += 1
+                timeout = budget_wait or None
+                if budget_wait > RATE_LIMIT_MAX_WAIT:
+                    self.queue_depth -= 1
+                    raise UpstreamRateLimited(f"Upstream rate limit budget is exhausted for {budget_wait:.1f}s", budget_wait)
+                if deadline is not None:
+                    remaining = deadline.remaining()
+                    if remaining <= 0 or (budget_wait and budget_wait > remaining):
+                        self.queue_depth -= 1
+                        raise DeadlineExceeded("Request deadline passed while waiting for upstream capacity")
+                    timeout = min(timeout or remaining, remaining)
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                except BaseException:
+                    self.queue_depth -= 1
+                    raise
+            if waited:
+                self.queue_depth -= 1
+            self.in_flight += 1
+            self.calls += 1
+            if self.remaining_requests is not None:
+                self.remaining_requests -= 1
+            if self.remaining_tokens is not None:
+                self.remaining_tokens -= tokens
+        waited_for = time.monotonic() - start
+        self.wait_seconds += waited_for
+        RATE_LIMIT_WAIT_SECONDS.observe(waited_for)
+        try:
+            yield
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def observe(self, headers: Mapping[str, str]):
+        """Take the remaining budget from a response's x-ratelimit-* headers"""
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            remaining = float(remaining)
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) or 0
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            # The reset time is when the whole budget is back, so the budget refills at (limit - remaining) / reset
+            refill = (float(limit) - remaining) / reset if limit is not None and reset > 0 and float(limit) > remaining else None
+            setattr(self, f"remaining_{kind}", remaining)
+            setattr(self, f"{kind}_reset_at", now + reset)
+            setattr(self, f"{kind}_refill", refill)
+
+    def record_success(self):
+        # Additive increase: about one more slot per limit's worth of successful calls
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    def record_throttle(self, wait: Optional[float]):
+        now = time.monotonic()
+        self.throttles += 1
+        RATE_LIMIT_THROTTLES.inc()
+        if now - self._last_decrease >= RATE_LIMIT_DECREASE_COOLDOWN:
+            self.limit = max(float(self.min_concurrency), self.limit * RATE_LIMIT_DECREASE)
+            self._last_decrease = now
+        if wait:
+            self.paused_until = max(self.paused_until, now + wait)
+
+    def record_error(self, e: BaseException) -> Optional[float]:
+        """Take the budget from a failed call's headers and shrink the limit on a 429; returns its Retry-After"""
+        status = error_status(e)
+        headers = error_headers(e)
+        if status is not None:
+            self.observe(headers)
+        wait = retry_after(headers)
+        if status == 429:
+            self.record_throttle(wait)
+        return wait
+
+    def retry_delay(self, section: str, e: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to back off before retrying after `e`, or None if the call should fail.
+
+        Retries 429s, 5xx responses and connection errors with full-jitter
+        exponential backoff, never sooner than the server's Retry-After.
+        Raises UpstreamRateLimited when 429s outlast the retries.
+        """
+        status = error_status(e)
+        wait = self.record_error(e)
+        if status == 429:
+            reason = "429"
+        elif status is not None and status >= 500:
+            reason = "5xx"
+        elif status is None and isinstance(e, openai.APIConnectionError):
+            reason = "connection"
+        else:
+            return None
+
+        delay = max(wait or 0.0, self.rng.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt)))
+        deadline = current_deadline()
+        if status == 429 and delay > RATE_LIMIT_MAX_WAIT:
+            raise UpstreamRateLimited(f"Upstream rate limit asks for a {delay:.1f}s wait", wait) from e
+        if attempt >= self.max_retries or (deadline is not None and deadline.remaining() <= delay):
+            if status == 429:
+                raise UpstreamRateLimited(f"Upstream rate limit persisted after {attempt + 1} attempts", wait) from e
+            return None
+        self.retries += 1
+        UPSTREAM_RETRIES.inc(section=section, reason=reason)
+        return delay
+
+    async def call(self, section: str, fn, tokens: int = 0):
+        """Run `fn()` in a slot, retrying as `retry_delay` allows"""
+        attempt = 0
+        while True:
+            async with self.slot(tokens):
+                try:
+                    result = await fn()
+                except Exception as e:
+                    delay = self.retry_delay(section, e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    self.record_success()
+                    return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "queued": self.queued,
+            "budget_waits": self.budget_waits,
+            "mean_wait_ms": round(self.wait_seconds / self.calls * 1000, 3) if self.calls else 0.0,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens
+        }
+
+
+rate_limiter = RateLimitScheduler()
@@ -0,0 +1,159 @@
+"""
+Per-section model routing.
+
+Every completion call names the package section it generates. The routing
+table maps each section to a model, a max_tokens budget and a temperature,
+and optionally to an OpenAI-compatible base URL for a self-hosted model.
+Sections the table does not list use its "default" entry. The table is
+loaded once at startup, from ROUTING_CONFIG_PATH when set, so a section can
+be moved to a smaller or local model without a code change.
+
+Each route keeps its own latency, token and quality stats: errors,
+truncated completions and failed sections. These show what a cheaper model
+costs in output before a route is switched for good.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+from hedging import LatencyTracker
+from metrics import SECTION_FAILURES
+
+# JSON file whose entries override DEFAULT_ROUTES per section (unset = use the defaults)
+ROUTING_CONFIG_PATH = os.getenv("ROUTING_CONFIG_PATH") or None
+
+# Each entry may set model, max_tokens, temperature (null = the provider's default),
+# base_url (null = OPENAI_BASE_URL) and api_key_env (variable holding the key for base_url).
+# Entries are merged over "default".
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "default": {"model": "gpt-4o-mini", "max_tokens": 500, "temperature": 0.7, "base_url": None, "api_key_env": None},
+    "package": {"max_tokens": 3000},
+    "title": {"max_tokens": 100, "temperature": None},
+    "hook": {"max_tokens": 200, "temperature": None},
+    "screenplay": {"max_tokens": 800},
+    "shot_list": {"max_tokens": 600},
+    "dialogue": {"max_tokens": 600},
+    "camera_angles": {"max_tokens": 500},
+    "music_suggestions": {"max_tokens": 400},
+    "thumbnail_concepts": {"max_tokens": 400},
+    "posting_strategy": {"max_tokens": 500},
+    "outline": {"max_tokens": 700},
+    "scene": {"max_tokens": 900},
+    "platform_adaptation": {"max_tokens": 600}
+}
+
+ROUTE_FIELDS = ("model", "max_tokens", "temperature", "base_url", "api_key_env")
+
+
+class Route:
+    """Model and sampling settings for one section, with the stats of calls made on it"""
+
+    def __init__(self, section: str, model: str, max_tokens: Optional[int], temperature: Optional[float],
+                 base_url: Optional[str] = None, api_key_env: Optional[str] = None):
+        self.section = section
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self.calls = 0
+        self.errors = 0
+        self.truncated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def fill(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """chat.completions.create kwargs with the route's settings for anything the caller left out"""
+        settings = {"model": self.model, "max_tokens": self.max_tokens, "temperature": self.temperature}
+        return {**{name: value for name, value in settings.items() if value is not None}, **kwargs}
+
+    def config(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in ROUTE_FIELDS if getattr(self, field) is not None}
+
+
+class ModelRouter:
+    """Routing table from section to Route, with per-route latency, token and quality stats"""
+
+    def __init__(self, entries: Dict[str, Dict[str, Any]]):
+        if "default" not in entries:
+            raise ValueError("Routing table has no default entry")
+        unknown = {field for entry in entries.values() for field in entry} - set(ROUTE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown routing fields: {sorted(unknown)}")
+        self.default = entries["default"]
+        self.routes: Dict[str, Route] = {
+            section: self._route(section, entry) for section, entry in entries.items() if section != "default"
+        }
+        self.latencies = LatencyTracker()
+
+    def _route(self, section: str, entry: Dict[str, Any]) -> Route:
+        merged = {**self.default, **entry}
+        if not merged.get("model"):
+            raise ValueError(f"Route '{section}' has no model")
+        return Route(section, **{field: merged.get(field) for field in ROUTE_FIELDS})
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "ModelRouter":
+        """Build from DEFAULT_ROUTES, with each entry of the JSON file at `path` merged over the same section's"""
+        entries = {section: dict(entry) for section, entry in DEFAULT_ROUTES.items()}
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                for section, entry in json.load(f).items():
+                    entries[section] = {**entries.get(section, {}), **entry}
+            print(f"Loaded model routes from {path}")
+        return cls(entries)
+
+    def route(self, section: str) -> Route:
+        route = self.routes.get(section)
+        if route is None:
+            # Sections added without a table entry get the default settings
+            route = self.routes[section] = self._route(section, {})
+        return route
+
+    def api_key_env(self, base_url: str) -> Optional[str]:
+        """Variable holding the API key for `base_url`, as set on any route using it"""
+        return next((route.api_key_env for route in self.routes.values()
+                     if route.base_url == base_url and route.api_key_env), None)
+
+    def record(self, route: Route, seconds: float, response):
+        route.calls += 1
+        self.latencies.record(f"{route.section}:{route.model}", seconds)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            route.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            route.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        choices = getattr(response, "choices", None)
+        if choices and choices[0].finish_reason == "length":
+            route.truncated += 1
+
+    def record_stream(self, route: Route, seconds: float):
+        # Streams carry no usage block or finish reason here
+        route.calls += 1
+        self.latencies.record(f"{route.section}:{route.model}", seconds)
+
+    def record_error(self, route: Route):
+        route.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        failures = {dict(key).get("section"): value for key, value in SECTION_FAILURES.values.items()}
+        routes = {}
+        for section, route in sorted(self.routes.items()):
+            key = f"{section}:{route.model}"
+            p50 = self.latencies.percentile(key, 0.5, 1)
+            p95 = self.latencies.percentile(key, 0.95, 1)
+            routes[section] = {
+                **route.config(),
+                "calls": route.calls,
+                "errors": route.errors,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "mean_prompt_tokens": round(route.prompt_tokens / route.calls, 1) if route.calls else 0.0,
+                "mean_completion_tokens": round(route.completion_tokens / route.calls, 1) if route.calls else 0.0,
+                "truncation_rate": round(route.truncated / route.calls, 4) if route.calls else 0.0,
+                "section_failures": int(failures.get(section, 0))
+            }
+        return routes
+
+
+router = ModelRouter.load(ROUTING_CONFIG_PATH)
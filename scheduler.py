@@ -0,0 +1,111 @@
+"""
+Dependency-aware scheduler for production package sections.
+
+Each section declares which other sections it needs. Sections whose
+dependencies are satisfied run concurrently, bounded by a concurrency limit,
+and the wall time of every section is recorded.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass
+class Section:
+    """A named unit of work; `run` receives the results of its `deps`.
+
+    `inputs` names the request fields the section reads, so its result can
+    be cached on just those fields and its dependencies.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    inputs: Tuple[str, ...] = ()
+
+
+def topological_order(sections: List[Section], provided: Iterable[str] = ()) -> List[str]:
+    """Order section names so every section comes after its dependencies.
+
+    Names in `provided` are already available and may be depended on
+    without being scheduled.
+    """
+    by_name = {section.name: section for section in sections}
+    order: List[str] = []
+    state: Dict[str, str] = {}
+    provided = set(provided)
+
+    def visit(name: str, path: Tuple[str, ...]):
+        if state.get(name) == "done":
+            return
+        if name in provided and name not in by_name:
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Section dependency cycle: {' -> '.join(path + (name,))}")
+        if name not in by_name:
+            raise ValueError(f"Unknown section dependency: {name}")
+        state[name] = "visiting"
+        for dep in by_name[name].deps:
+            visit(dep, path + (name,))
+        state[name] = "done"
+        order.append(name)
+
+    for section in sections:
+        visit(section.name, ())
+    return order
+
+
+def with_dependents(sections: List[Section], names: Iterable[str]) -> Set[str]:
+    """Expand `names` with every section that depends on them, directly or indirectly"""
+    selected = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for section in sections:
+            if section.name not in selected and selected.intersection(section.deps):
+                selected.add(section.name)
+                changed = True
+    return selected
+
+
+async def run_sections(sections: List[Section], max_concurrency: int = 6,
+                       initial: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Run sections as a DAG and return (results, per-section wall time in seconds).
+
+    `initial` holds results that are already known, e.g. sections of an
+    existing package; sections may depend on them without re-running them.
+    Only the sections that ran are returned. The first failing section
+    cancels everything still pending and its exception is re-raised.
+    """
+    initial = initial or {}
+    by_name = {section.name: section for section in sections}
+    order = topological_order(sections, initial)
+    slots = asyncio.Semaphore(max(1, max_concurrency))
+    tasks: Dict[str, asyncio.Task] = {}
+    timings: Dict[str, float] = {}
+
+    async def run_one(section: Section):
+        running = [tasks[dep] for dep in section.deps if dep in tasks]
+        if running:
+            await asyncio.gather(*running)
+        dep_results = {dep: tasks[dep].result() if dep in tasks else initial[dep] for dep in section.deps}
+        async with slots:
+            start = time.perf_counter()
+            try:
+                return await section.run(dep_results)
+            finally:
+                timings[section.name] = time.perf_counter() - start
+
+    for name in order:
+        tasks[name] = asyncio.create_task(run_one(by_name[name]))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return {name: task.result() for name, task in tasks.items()}, timings
@@ -0,0 +1,181 @@
+"""
+Near-duplicate detection for submitted ideas.
+
+Ideas are reduced to shingles of consecutive words, so word order counts
+("why dogs hate cats" is not "why cats hate dogs"), and indexed with MinHash
+and LSH banding, one index per combination of the other request settings, so a
+package is only ever matched with one made for the same platform, duration,
+tone and audience. Candidates from the LSH buckets are then scored by exact
+Jaccard similarity. Everything runs in process; no embedding service is
+involved.
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "1") == "1"
+# Matches at or above this Jaccard score are served in place of a new package (> 1 never serves).
+# Off by default: a near match is only offered until a threshold has been checked against real traffic.
+SIMILARITY_SERVE_THRESHOLD = float(os.getenv("SIMILARITY_SERVE_THRESHOLD", "1.1"))
+# Matches at or above this score are offered by /similar-packages
+SIMILARITY_OFFER_THRESHOLD = float(os.getenv("SIMILARITY_OFFER_THRESHOLD", "0.5"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "200000"))
+
+# 16 bands of 4 rows: pairs at Jaccard 0.6 share a bucket ~90% of the time, pairs at 0.3 ~12%
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+# Upper bound on candidates scored per lookup, so huge buckets cannot make lookups slow
+MAX_CANDIDATES = 200
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+# Function words only: anything that can change what the video is about (best, easy, tips, why) stays in
+STOPWORDS = frozenset("""
+a an the and or but of to in on at by for with from into onto as is are be been being it its this that these those
+your you my our their his her i we they me us them do does did
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def idea_words(idea: str) -> List[str]:
+    """Words of an idea in order: lowercased, stopwords dropped, trailing plural 's' removed"""
+    words = []
+    for word in _WORD.findall(idea.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def idea_tokens(idea: str) -> FrozenSet[str]:
+    """Shingles of an idea: each pair of consecutive words, or the single word of a one-word idea"""
+    words = idea_words(idea)
+    if len(words) == 1:
+        return frozenset(words)
+    return frozenset(f"{first} {second}" for first, second in zip(words, words[1:]))
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(tokens: FrozenSet[str]) -> List[int]:
+    hashes = [_token_hash(token) for token in tokens]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])) for band in range(NUM_BANDS)]
+
+
+def jaccard(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class SimilarIdea:
+    def __init__(self, key: str, idea: str, score: float):
+        # Production cache key of the stored package
+        self.key = key
+        self.idea = idea
+        self.score = score
+
+
+class _Entry:
+    __slots__ = ("key", "idea", "partition", "tokens", "bands")
+
+    def __init__(self, key: str, idea: str, partition: Tuple[str, ...], tokens: FrozenSet[str], bands: List[Tuple[int, Tuple[int, ...]]]):
+        self.key = key
+        self.idea = idea
+        self.partition = partition
+        self.tokens = tokens
+        self.bands = bands
+
+
+class IdeaIndex:
+    """MinHash/LSH index of generated ideas, partitioned by the other request settings"""
+
+    def __init__(self, max_entries: int = SIMILARITY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # Insertion order doubles as eviction order
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, ...], Dict[Tuple[int, Tuple[int, ...]], Set[str]]] = {}
+        self.lookups = 0
+        self.matches = 0
+        self.lookup_seconds = 0.0
+
+    def add(self, key: str, idea: str, partition: Tuple[str, ...]):
+        """Index the idea whose package is cached under `key`"""
+        tokens = idea_tokens(idea)
+        if not tokens:
+            return
+        self.remove(key)
+        entry = _Entry(key, idea, partition, tokens, band_keys(minhash(tokens)))
+        buckets = self._buckets.setdefault(partition, {})
+        for band in entry.bands:
+            buckets.setdefault(band, set()).add(key)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        buckets = self._buckets.get(entry.partition, {})
+        for band in entry.bands:
+            keys = buckets.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del buckets[band]
+
+    def search(self, idea: str, partition: Tuple[str, ...], min_score: float, limit: int = 5) -> List[SimilarIdea]:
+        """Stored ideas in `partition` with Jaccard similarity of at least `min_score`, best first"""
+        start = time.perf_counter()
+        self.lookups += 1
+        tokens = idea_tokens(idea)
+        buckets = self._buckets.get(partition)
+        results: List[SimilarIdea] = []
+        if tokens and buckets:
+            candidates: Set[str] = set()
+            for band in band_keys(minhash(tokens)):
+                candidates.update(buckets.get(band, ()))
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+            for key in candidates:
+                entry = self._entries[key]
+                score = jaccard(tokens, entry.tokens)
+                if score >= min_score:
+                    results.append(SimilarIdea(key, entry.idea, round(score, 4)))
+            results.sort(key=lambda match: match.score, reverse=True)
+            results = results[:limit]
+        if results:
+            self.matches += 1
+        self.lookup_seconds += time.perf_counter() - start
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": SIMILARITY_ENABLED,
+            "entries": len(self._entries),
+            "partitions": len(self._buckets),
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "mean_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 4) if self.lookups else 0.0
+        }
+
+
+idea_index = IdeaIndex()
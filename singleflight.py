@@ -0,0 +1,64 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+While a call for a key is running, later callers with the same key wait on
+the same task instead of starting their own. The task is cancelled once
+every waiter has gone away.
+
+The task runs in an empty context rather than a copy of the leader's, so
+request-scoped state (deadline, usage tally) does not leak to the callers
+sharing its result. The factory applies whatever state the work should see.
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one task among concurrent callers that use the same key"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(factory(), context=contextvars.Context()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # Shield so one waiter disconnecting does not cancel the shared work
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+                self.cancelled += 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._calls)
+        }
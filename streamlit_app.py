@@ -4,6 +4,10 @@ import json
 from typing import Dict, Any
 import plotly.graph_objects as go
 import plotly.express as px
+import time
+
+# How long to wait for a background generation job before giving up
+JOB_POLL_TIMEOUT = 900
 
 # Page config
 st.set_page_config(
@@ -281,8 +285,8 @@ def show_beautiful_loading(idea, platform, duration, target_audience, tone):
             if not api_thread.is_alive():
                 break
 
-        # Wait for API call to complete
-        api_thread.join(timeout=30)  # 30 second timeout
+        # Wait for API call to complete (the job poll enforces its own time limit)
+        api_thread.join()
 
         # Complete the progress
         progress_bar.progress(1.0)
@@ -321,14 +325,26 @@ def show_beautiful_loading(idea, platform, duration, target_audience, tone):
 def generate_production_package(input_data: Dict[str, Any]) -> Dict[str, Any]:
     """Call the FastAPI backend to generate production package"""
     try:
-        # Try to call the actual API first
+        # Submit a background job and poll it, so long generations are not cut off by HTTP timeouts
         try:
-            response = requests.post("http://localhost:8000/generate-video-production", json=input_data, timeout=30)
-            if response.status_code == 200:
-                return response.json()
-            else:
+            # The backend drops the job once we stop polling for it
+            response = requests.post("http://localhost:8000/jobs", json=input_data, timeout=10,
+                                     headers={"X-Request-Timeout": str(JOB_POLL_TIMEOUT)})
+            if response.status_code != 202:
                 st.error("API server returned an error. Please check if the FastAPI server is running on localhost:8000")
                 return None
+
+            job_id = response.json()["id"]
+            deadline = time.time() + JOB_POLL_TIMEOUT
+            while time.time() < deadline:
+                job = requests.get(f"http://localhost:8000/jobs/{job_id}", timeout=10).json()
+                if job["status"] == "completed":
+                    return job["result"]
+                if job["status"] == "failed":
+                    raise Exception(job.get("error") or "Generation failed")
+                time.sleep(1)
+
+            raise Exception("Timed out waiting for the production package")
         except requests.exceptions.RequestException:
             st.error("Cannot connect to API server. Please make sure the FastAPI server is running on localhost:8000")
             return None
@@ -342,6 +358,10 @@ def generate_production_package(input_data: Dict[str, Any]) -> Dict[str, Any]:
 def display_production_package(data: Dict[str, Any]):
     """Display the complete production package"""
 
+    if data.get("partial"):
+        missing = ", ".join(name.replace("_", " ") for name in data.get("missing_sections", []))
+        st.warning(f"⚠️ Part of this package could not be generated in full ({missing}). Try again for a complete version.")
+
     # Title and Hook
     st.markdown('<div class="section-header">📺 Video Title & Hook</div>', unsafe_allow_html=True)
     st.markdown(f'<div class="production-card"><h3>Title:</h3><p>{data["title"]}</p></div>', unsafe_allow_html=True)
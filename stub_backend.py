@@ -0,0 +1,370 @@
+"""
+Offline, deterministic LLM backend for load testing.
+
+Returns schema-valid content for every package section without any network
+access. Latency, token rate and failures are simulated and configurable:
+
+    STUB_LATENCY_DISTRIBUTION  lognormal | uniform | fixed  (time to first token)
+    STUB_LATENCY_MEDIAN        seconds, default 0.5
+    STUB_LATENCY_SIGMA         lognormal sigma / uniform half-width, default 0.3
+    STUB_TOKENS_PER_SECOND     completion token rate, default 80 (0 = instant)
+    STUB_FAILURE_RATE          probability a call fails, default 0
+    STUB_FAILURE_STATUS        HTTP status of injected failures, default 500
+    STUB_SEED                  seed for the latency/failure RNG
+    STUB_LATENCY_PROFILE       JSON file with per-section overrides of the
+                               latency settings (see benchmarks/latency_profiles.json)
+    STUB_TIME_SCALE            multiplier applied to every simulated delay, default 1
+    STUB_RATE_LIMIT_RPM        simulated requests-per-minute limit, default 0 (off)
+    STUB_RATE_LIMIT_TPM        simulated tokens-per-minute limit, default 0 (off)
+    STUB_PREFIX_CACHE_MIN_TOKENS  shortest first message reported as a cached
+                               prompt prefix when repeated, default 1024 (like
+                               OpenAI); cached counts are whole 128-token blocks
+
+Content depends only on the prompt, so identical requests get identical
+answers. With a rate limit set, every call reports OpenAI-style
+x-ratelimit-* headers to the rate-limit scheduler, and calls over the
+budget fail with a 429 carrying retry-after-ms. The minute is scaled by
+STUB_TIME_SCALE like every other delay.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.completion_usage import CompletionUsage
+
+from llm import LLMBackend
+from rate_limit import estimate_tokens, rate_limiter
+
+# Rough characters-per-token ratio used for token accounting
+CHARS_PER_TOKEN = 4
+# Granularity of simulated prompt-cache hits
+PREFIX_CACHE_BLOCK_TOKENS = 128
+
+
+class StubUpstreamError(Exception):
+    """Injected upstream failure carrying an HTTP status and headers like the OpenAI errors do"""
+
+    def __init__(self, status_code: int, message: str = "Injected stub failure", headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _format_reset(seconds: float) -> str:
+    """Reset time in the x-ratelimit-reset-* format, e.g. "20ms", "1.5s" or "6m0s" """
+    if seconds < 1:
+        return f"{int(seconds * 1000)}ms"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}m{seconds:.1f}s" if minutes else f"{seconds:.1f}s"
+
+
+class StubRateLimit:
+    """Requests and tokens per minute, refilled continuously like the provider's limits"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, minute: float):
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.remaining = dict(self.limits)
+        self.minute = minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        for kind, limit in self.limits.items():
+            if limit > 0:
+                self.remaining[kind] = min(limit, self.remaining[kind] + elapsed * limit / self.minute)
+
+    def _reset(self, kind: str) -> float:
+        """Seconds until the `kind` budget is full again"""
+        limit = self.limits[kind]
+        return (limit - self.remaining[kind]) * self.minute / limit
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        for kind, limit in self.limits.items():
+            if limit > 0:
+                headers[f"x-ratelimit-limit-{kind}"] = str(int(limit))
+                headers[f"x-ratelimit-remaining-{kind}"] = str(max(0, int(self.remaining[kind])))
+                headers[f"x-ratelimit-reset-{kind}"] = _format_reset(self._reset(kind))
+        return headers
+
+    def take(self, tokens: int) -> Dict[str, str]:
+        """Spend one request and `tokens`, returning the response headers; raise a 429 if over budget"""
+        self._refill()
+        cost = {"requests": 1, "tokens": tokens}
+        short = [kind for kind, limit in self.limits.items() if limit > 0 and self.remaining[kind] < min(cost[kind], limit)]
+        if short:
+            wait = max((min(cost[kind], self.limits[kind]) - self.remaining[kind]) * self.minute / self.limits[kind] for kind in short)
+            headers = {**self.headers(), "retry-after-ms": str(max(1, int(wait * 1000)))}
+            raise StubUpstreamError(429, f"Rate limit reached for {' and '.join(short)}", headers)
+        for kind, limit in self.limits.items():
+            if limit > 0:
+                self.remaining[kind] -= cost[kind]
+        return self.headers()
+
+
+def _prompt_text(messages: List[Dict]) -> str:
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+
+def _scene_timings(prompt: str) -> List[str]:
+    """Scene timings the prompt asks for, or a default 5-scene layout"""
+    match = re.search(r"Scene timings:\s*([0-9:,\- ]+)", prompt)
+    if match:
+        timings = [timing.strip() for timing in match.group(1).split(",") if timing.strip()]
+        if timings:
+            return timings
+    count_match = re.search(r"exactly (\d+) scenes", prompt)
+    count = int(count_match.group(1)) if count_match else 5
+    return [f"{index}:00-{index + 1}:00" for index in range(count)]
+
+
+def _scene_timing(prompt: str) -> str:
+    """Time slot of the single scene a long-form scene prompt asks for"""
+    match = re.search(r"Scene timing:\s*([0-9:\-]+)", prompt)
+    return match.group(1) if match else "0:00-1:00"
+
+
+def _topic(prompt: str) -> str:
+    match = re.search(r"(?:Idea|about|for):\s*(.+)", prompt)
+    return match.group(1).strip()[:80] if match else "this video"
+
+
+class StubBackend(LLMBackend):
+    """Simulated completions with configurable latency, token rate and failures"""
+
+    name = "stub"
+
+    def __init__(self):
+        self.defaults = {
+            "distribution": os.getenv("STUB_LATENCY_DISTRIBUTION", "lognormal"),
+            "latency_median": float(os.getenv("STUB_LATENCY_MEDIAN", "0.5")),
+            "latency_sigma": float(os.getenv("STUB_LATENCY_SIGMA", "0.3")),
+            "tokens_per_second": float(os.getenv("STUB_TOKENS_PER_SECOND", "80"))
+        }
+        self.section_settings: Dict[str, Dict] = {}
+        profile_path = os.getenv("STUB_LATENCY_PROFILE")
+        if profile_path:
+            with open(profile_path) as profile_file:
+                profile = json.load(profile_file)
+            self.defaults.update(profile.get("default", {}))
+            self.section_settings = profile.get("sections", {})
+        self.time_scale = float(os.getenv("STUB_TIME_SCALE", "1"))
+        self.failure_rate = float(os.getenv("STUB_FAILURE_RATE", "0"))
+        self.failure_status = int(os.getenv("STUB_FAILURE_STATUS", "500"))
+        seed = os.getenv("STUB_SEED")
+        self.rng = random.Random(int(seed) if seed else None)
+        self.prefix_cache_min_tokens = int(os.getenv("STUB_PREFIX_CACHE_MIN_TOKENS", "1024"))
+        requests_per_minute = float(os.getenv("STUB_RATE_LIMIT_RPM", "0"))
+        tokens_per_minute = float(os.getenv("STUB_RATE_LIMIT_TPM", "0"))
+        self.rate_limit = None
+        if requests_per_minute > 0 or tokens_per_minute > 0:
+            self.rate_limit = StubRateLimit(requests_per_minute, tokens_per_minute, 60 * self.time_scale)
+        self._seen_prefixes = set()
+        self.calls = 0
+
+    def settings(self, section: str) -> Dict:
+        return {**self.defaults, **self.section_settings.get(section, {})}
+
+    def first_token_latency(self, section: str) -> float:
+        settings = self.settings(section)
+        median, sigma = settings["latency_median"], settings["latency_sigma"]
+        if settings["distribution"] == "fixed":
+            latency = median
+        elif settings["distribution"] == "uniform":
+            latency = max(0.0, self.rng.uniform(median - sigma, median + sigma))
+        else:
+            latency = self.rng.lognormvariate(0, sigma) * median
+        return latency * self.time_scale
+
+    def generation_time(self, section: str, completion_tokens: int) -> float:
+        tokens_per_second = self.settings(section)["tokens_per_second"]
+        if tokens_per_second <= 0:
+            return 0.0
+        return completion_tokens / tokens_per_second * self.time_scale
+
+    def maybe_fail(self):
+        if self.failure_rate > 0 and self.rng.random() < self.failure_rate:
+            raise StubUpstreamError(self.failure_status)
+
+    def admit(self, kwargs: Dict) -> Optional[Dict[str, str]]:
+        """Charge the simulated rate limit for a call, returning the headers its response will carry"""
+        if self.rate_limit is None:
+            return None
+        return self.rate_limit.take(estimate_tokens(kwargs))
+
+    def report(self, headers: Optional[Dict[str, str]]):
+        # Headers arrive with the response, like the OpenAI backend's
+        if headers is not None:
+            rate_limiter.observe(headers)
+
+    def cached_tokens(self, messages: List[Dict]) -> int:
+        """Simulated prompt-cache hit: a repeated first message counts as a cached prefix"""
+        if not messages:
+            return 0
+        prefix = str(messages[0].get("content", ""))
+        tokens = len(prefix) // CHARS_PER_TOKEN
+        if tokens < self.prefix_cache_min_tokens:
+            return 0
+        digest = hashlib.sha256(prefix.encode("utf-8")).digest()
+        if digest not in self._seen_prefixes:
+            self._seen_prefixes.add(digest)
+            return 0
+        return tokens // PREFIX_CACHE_BLOCK_TOKENS * PREFIX_CACHE_BLOCK_TOKENS
+
+    def render(self, section: str, messages: List[Dict], max_tokens: int):
+        """Return (content, finish_reason, prompt_tokens, completion_tokens)"""
+        prompt = _prompt_text(messages)
+        content = self.content_for(section, prompt)
+        finish_reason = "stop"
+        if max_tokens and len(content) > max_tokens * CHARS_PER_TOKEN:
+            content = content[:max_tokens * CHARS_PER_TOKEN]
+            finish_reason = "length"
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        completion_tokens = max(1, len(content) // CHARS_PER_TOKEN)
+        return content, finish_reason, prompt_tokens, completion_tokens
+
+    def content_for(self, section: str, prompt: str) -> str:
+        topic = _topic(prompt)
+        variant = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:6], 16) % 97
+        timings = _scene_timings(prompt)
+
+        # Scene numbers and timings are filled in by the server, so the model does not write them
+        screenplay = [
+            {"description": f"Scene {index + 1}: {topic}",
+             "action": f"Host demonstrates step {index + 1} of {topic} with close-ups and on-screen text (take {variant})."}
+            for index, timing in enumerate(timings)
+        ]
+        shot_list = [
+            {"shot": index + 1, "type": shot_type, "description": f"{shot_type} of the host working on {topic}",
+             "duration": f"{10 + index * 5} seconds", "purpose": "Keep viewers oriented and engaged"}
+            for index, shot_type in enumerate(["Wide shot", "Medium shot", "Close-up", "Over-shoulder", "B-roll"])
+        ]
+        dialogue = [
+            {"speaker": "Host", "line": f"Line {index + 1} about {topic}, said naturally to camera.", "timing": timing}
+            for index, timing in enumerate(timings[:5])
+        ]
+        camera_angles = [
+            {"angle": angle, "movement": movement, "purpose": f"Show {topic} clearly", "timing": moment}
+            for angle, movement, moment in [
+                ("Eye level", "Static", "Opening"), ("High angle", "Slow pan", "Demonstration"),
+                ("Low angle", "Dolly in", "Key moment"), ("Over-shoulder", "Handheld", "Details"),
+                ("Eye level", "Zoom out", "Closing")
+            ]
+        ]
+        music = [f"{mood} track to support {topic} during the {part}" for mood, part in [
+            ("Upbeat acoustic", "intro"), ("Light lo-fi", "main segments"), ("Soft ambient", "demonstrations"),
+            ("Rising electronic", "transitions"), ("Warm piano", "outro")
+        ]]
+        thumbnails = [f"Concept {index + 1}: bold close-up of {topic} with high-contrast text and a bright accent color"
+                      for index in range(5)]
+        posting_strategy = {
+            "best_time": "Weekdays 5-8 PM local time",
+            "hashtags": ["#howto", "#tutorial", "#creator", "#tips", f"#idea{variant}"],
+            "description": f"Everything you need to know about {topic}.",
+            "engagement_tactics": ["Ask viewers a question in the first minute", "Pin a comment with a call to action"]
+        }
+
+        if section == "package":
+            return json.dumps({
+                "title": f"The Ultimate Guide: {topic}",
+                "hook": f"Stop scrolling - here is the fastest way to master {topic}.",
+                "screenplay": screenplay,
+                "shot_list": shot_list,
+                "dialogue": dialogue,
+                "camera_angles": camera_angles,
+                "music_suggestions": music,
+                "thumbnail_concepts": thumbnails,
+                "posting_strategy": posting_strategy
+            }, indent=2)
+        if section == "outline":
+            return json.dumps({
+                "title": f"The Ultimate Guide: {topic}",
+                "hook": f"Stop scrolling - here is the fastest way to master {topic}.",
+                "scenes": [{"description": scene["description"], "summary": f"Part {index + 1} of {topic}, building on the last."}
+                           for index, scene in enumerate(screenplay)]
+            }, indent=2)
+        if section == "scene":
+            timing = _scene_timing(prompt)
+            return json.dumps({
+                "action": f"Host works through this part of {topic} step by step with close-ups and on-screen text (take {variant}).",
+                "dialogue": [{"speaker": "Host", "line": f"Line {index + 1} of this scene about {topic}.", "timing": timing} for index in range(3)],
+                "shots": shot_list[:3]
+            }, indent=2)
+        if section == "platform_adaptation":
+            return json.dumps({
+                "title": f"The Ultimate Guide: {topic}",
+                "hook": f"Stop scrolling - here is the fastest way to master {topic}.",
+                "thumbnail_concepts": thumbnails[:3],
+                "posting_strategy": posting_strategy
+            }, indent=2)
+        if section == "title":
+            return f"The Ultimate Guide: {topic}"
+        if section == "hook":
+            return f"Stop scrolling - here is the fastest way to master {topic}."
+        if section == "screenplay":
+            return json.dumps(screenplay)
+        if section == "shot_list":
+            return json.dumps(shot_list)
+        if section == "dialogue":
+            return json.dumps(dialogue)
+        if section == "camera_angles":
+            return json.dumps(camera_angles)
+        if section == "music_suggestions":
+            return "\n".join(music)
+        if section == "thumbnail_concepts":
+            return "\n".join(thumbnails)
+        if section == "posting_strategy":
+            return json.dumps(posting_strategy)
+        return f"Stub response about {topic}."
+
+    async def complete(self, section: str, base_url: Optional[str] = None, **kwargs):
+        self.calls += 1
+        headers = self.admit(kwargs)
+        await asyncio.sleep(self.first_token_latency(section))
+        self.maybe_fail()
+        self.report(headers)
+        content, finish_reason, prompt_tokens, completion_tokens = self.render(
+            section, kwargs.get("messages", []), kwargs.get("max_tokens") or 0
+        )
+        await asyncio.sleep(self.generation_time(section, completion_tokens))
+        return ChatCompletion(
+            id=f"stub-{uuid.uuid4().hex}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=kwargs.get("model", "stub"),
+            choices=[Choice(
+                index=0,
+                finish_reason=finish_reason,
+                message=ChatCompletionMessage(role="assistant", content=content)
+            )],
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                prompt_tokens_details={"cached_tokens": self.cached_tokens(kwargs.get("messages", []))}
+            )
+        )
+
+    async def stream(self, section: str, base_url: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        self.calls += 1
+        headers = self.admit(kwargs)
+        await asyncio.sleep(self.first_token_latency(section))
+        self.maybe_fail()
+        self.report(headers)
+        content, _, _, _ = self.render(section, kwargs.get("messages", []), kwargs.get("max_tokens") or 0)
+
+        # Emit roughly 8 tokens per chunk at the configured token rate
+        chunk_size = 8 * CHARS_PER_TOKEN
+        for start in range(0, len(content), chunk_size):
+            await asyncio.sleep(self.generation_time(section, 8))
+            yield content[start:start + chunk_size]
@@ -0,0 +1,21 @@
+import pytest
+
+from deadlines import DEADLINE_MIN_TOKENS, DeadlineExceeded, budget_max_tokens, deadline_scope
+
+
+def test_budget_is_unchanged_without_a_deadline():
+    assert budget_max_tokens(3000) == 3000
+
+
+def test_budget_is_cut_without_marking_the_deadline_degraded():
+    with deadline_scope(5) as deadline:
+        budget = budget_max_tokens(3000)
+    assert DEADLINE_MIN_TOKENS <= budget < 3000
+    # Only an answer actually cut off at the smaller limit degrades the request
+    assert not deadline.degraded
+
+
+def test_budget_raises_when_no_useful_answer_fits():
+    with deadline_scope(0.5):
+        with pytest.raises(DeadlineExceeded):
+            budget_max_tokens(3000)
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from json_repair import loads_truncated, recover_object
+
+
+def test_single_line_keeps_members_around_a_malformed_one():
+    text = ('Here you go: {"title": "T", "hook": "H", "screenplay": [{"scene": 1}, {"scene": oops}], '
+            '"shot_list": [{"shot": 1}], "posting_strategy": {"best_time": "9am"}}')
+    recovered = recover_object(text)
+    assert recovered.complete == ["title", "hook", "shot_list", "posting_strategy"]
+    # The malformed member keeps its elements up to the last complete one
+    assert recovered.data["screenplay"] == [{"scene": 1}]
+
+
+def test_single_line_truncated():
+    recovered = recover_object('{"title": "T", "hook": "H", "music_suggestions": ["a", "b"')
+    assert recovered.complete == ["title", "hook"]
+    assert recovered.data["music_suggestions"] == ["a", "b"]
+
+
+def test_truncation_inside_nested_array_drops_empty_elements():
+    recovered = recover_object('{"title": "T",\n "screenplay": [{"scene": 1, "description": "Intro"}, {')
+    assert recovered.complete == ["title"]
+    assert recovered.data["screenplay"] == [{"scene": 1, "description": "Intro"}]
+
+
+def test_truncation_inside_nested_element_cuts_after_last_complete_value():
+    recovered = recover_object('{"title": "T", "screenplay": [{"scene": 1}, {"scene": 2, "descr')
+    assert recovered.data["screenplay"] == [{"scene": 1}, {"scene": 2}]
+
+
+def test_truncation_inside_nested_arrays():
+    assert loads_truncated('{"grid": [[1, 2], [3, [') == {"grid": [[1, 2], [3]]}
+
+
+def test_no_object_raises():
+    with pytest.raises(ValueError):
+        recover_object("I could not write that package.")
+
+
+def test_complete_object_is_unchanged():
+    package = {"title": "T", "screenplay": [{"scene": 1}], "music_suggestions": []}
+    recovered = recover_object(json.dumps(package))
+    assert recovered.data == package
+    assert recovered.complete == list(package)
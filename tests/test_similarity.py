@@ -0,0 +1,26 @@
+from similarity import IdeaIndex, idea_tokens, jaccard
+
+
+def score(left: str, right: str) -> float:
+    return jaccard(idea_tokens(left), idea_tokens(right))
+
+
+def test_word_order_matters():
+    assert score("why dogs hate cats", "why cats hate dogs") == 0.0
+
+
+def test_descriptive_words_are_content():
+    assert score("easy pasta recipe", "pasta recipe") < 1.0
+    assert score("best tips for coffee", "coffee video guide") == 0.0
+
+
+def test_rewordings_still_match():
+    assert score("How to brew pour over coffee at home", "how to brew pour-over coffee at home easily") >= 0.8
+
+
+def test_index_finds_near_duplicates_in_the_same_partition_only():
+    index = IdeaIndex()
+    index.add("k1", "how to brew pour over coffee at home", ("youtube",))
+    matches = index.search("how to brew pour-over coffee at home easily", ("youtube",), 0.5)
+    assert [match.key for match in matches] == ["k1"]
+    assert index.search("how to brew pour-over coffee at home easily", ("tiktok",), 0.5) == []